@@ -10,7 +10,7 @@ import click
 from sphinxcontrib.versioning import __version__
 from sphinxcontrib.versioning.git import clone, commit_and_push, get_root, GitError
 from sphinxcontrib.versioning.lib import Config, HandledError, TempDir
-from sphinxcontrib.versioning.routines import build_all, gather_git_info, pre_build, read_local_conf
+from sphinxcontrib.versioning.routines import build_all, gather_git_info, pre_build, read_local_conf, validate_all
 from sphinxcontrib.versioning.setup_logging import setup_logging
 from sphinxcontrib.versioning.versions import multi_sort, Versions
 
@@ -188,21 +188,48 @@ def build_options(func):
     func = click.option('-b', '--show-banner', help='Show a warning banner.', is_flag=True)(func)
     func = click.option('-B', '--banner-main-ref',
                         help="Don't show banner on this ref and point banner URLs to this ref. Default master.")(func)
+    func = click.option('-f', '--fetch-depth', type=click.IntRange(min=1),
+                        help='Only fetch this many commits of missing branches/tags (for shallow clones).')(func)
+    func = click.option('-H', '--hardlink-exports', is_flag=True,
+                        help='Hard link exported files from one store of unique file contents.')(func)
+    func = click.option('-I', '--incremental', is_flag=True,
+                        help='Skip versions unchanged since the previous build in DESTINATION.')(func)
     func = click.option('-i', '--invert', help='Invert/reverse order of versions.', is_flag=True)(func)
+    func = click.option('-j', '--jobs', type=click.IntRange(min=1),
+                        help='Build up to this many versions in parallel (sphinx-build processes). Default 1.')(func)
+    func = click.option('-k', '--cache-dir', type=click.Path(file_okay=False, dir_okay=True),
+                        help='Keep exported versions in this directory and reuse them in later runs.')(func)
+    func = click.option('-K', '--cache-limit', type=click.IntRange(min=1),
+                        help='Max number of exported trees kept in --cache-dir. Default 50.')(func)
+    func = click.option('-J', '--versions-json', is_flag=True,
+                        help='Load the list of versions in pages from one versions.json file with JavaScript.')(func)
+    func = click.option('-m', '--ls-remote-ttl', type=click.IntRange(min=1),
+                        help='Reuse the list of remote branches/tags for this many seconds (push retries).')(func)
     func = click.option('-p', '--priority', type=click.Choice(('branches', 'tags')),
                         help="Group these kinds of versions at the top (for themes that don't separate them).")(func)
     func = click.option('-r', '--root-ref',
                         help='The branch/tag at the root of DESTINATION. Will also be in subdir. Default master.')(func)
+    func = click.option('-R', '--local-refs', is_flag=True,
+                        help="Read branches/tags from local refs/remotes/origin and refs/tags, don't ask origin.")(func)
     func = click.option('-s', '--sort', multiple=True, type=click.Choice(('semver', 'alpha', 'time')),
                         help='Sort versions. Specify multiple times to sort equal values of one kind.')(func)
+    func = click.option('-S', '--validate-summary', type=click.Path(dir_okay=False),
+                        help='Write results of --validate to this JSON file. Implies -V.')(func)
     func = click.option('-t', '--greatest-tag', is_flag=True,
                         help='Override root-ref to be the tag with the highest version number.')(func)
     func = click.option('-T', '--recent-tag', is_flag=True,
                         help='Override root-ref to be the most recent committed tag.')(func)
+    func = click.option('-V', '--validate', is_flag=True,
+                        help='Parse all versions before building HTML and skip the ones that fail.')(func)
     func = click.option('-w', '--whitelist-branches', multiple=True,
                         help='Whitelist branches that match the pattern. Can be specified more than once.')(func)
     func = click.option('-W', '--whitelist-tags', multiple=True,
                         help='Whitelist tags that match the pattern. Can be specified more than once.')(func)
+    func = click.option('-x', '--export-docs-only', is_flag=True,
+                        help='Only export the directory with conf.py from git instead of the whole repo.')(func)
+    func = click.option('-X', '--export-include', multiple=True,
+                        help='Also export this path relative to git root. Implies -x. Can be specified more than '
+                             'once.')(func)
 
     return func
 
@@ -302,6 +329,12 @@ def build(config, rel_source, destination, **options):
     # Pre-build.
     log.info("Pre-running Sphinx to collect versions' master_doc and other info.")
     exported_root = pre_build(config.git_root, versions)
+
+    # Validate.
+    if config.validate or config.validate_summary:
+        log.info('Parsing all versions to skip broken ones before building HTML.')
+        validate_all(exported_root, versions)
+
     if config.banner_main_ref and config.banner_main_ref not in [r['name'] for r in versions.remotes]:
         log.warning('Banner main ref %s failed during pre-run. Disabling banner.', config.banner_main_ref)
         config.update(dict(banner_greatest_tag=False, banner_main_ref=None, banner_recent_tag=False, show_banner=False),
@@ -311,8 +344,9 @@ def build(config, rel_source, destination, **options):
     build_all(exported_root, destination, versions)
 
     # Cleanup.
-    log.debug('Removing: %s', exported_root)
-    shutil.rmtree(exported_root)
+    if not config.cache_dir:
+        log.debug('Removing: %s', exported_root)
+        shutil.rmtree(exported_root)
 
     # Store versions in state for push().
     config['versions'] = versions
@@ -320,6 +354,8 @@ def build(config, rel_source, destination, **options):
 
 @cli.command(cls=ClickCommand)
 @build_options
+@click.option('-C', '--clone-dir', type=click.Path(file_okay=False, dir_okay=True),
+              help='Keep the clone of DEST_BRANCH in this directory and update it in later runs.')
 @click.option('-e', '--grm-exclude', multiple=True,
               help='If specified "git rm" will delete all files in REL_DEST except for these. Specify multiple times '
                    'for more. Paths are relative to REL_DEST in DEST_BRANCH.')
@@ -367,21 +403,28 @@ def push(ctx, config, rel_source, dest_branch, rel_dest, **options):
     # Clone, build, push.
     for _ in range(PUSH_RETRIES):
         with TempDir() as temp_dir:
-            log.info('Cloning %s into temporary directory...', dest_branch)
+            if config.clone_dir:
+                work_dir = os.path.abspath(config.clone_dir)
+                if not os.path.isdir(work_dir):
+                    os.makedirs(work_dir)
+                log.info('Updating clone of %s in %s...', dest_branch, work_dir)
+            else:
+                work_dir = temp_dir
+                log.info('Cloning %s into temporary directory...', dest_branch)
             try:
-                clone(config.git_root, temp_dir, config.push_remote, dest_branch, rel_dest, config.grm_exclude)
+                clone(config.git_root, work_dir, config.push_remote, dest_branch, rel_dest, config.grm_exclude)
             except GitError as exc:
                 log.error(exc.message)
                 log.error(exc.output)
                 raise HandledError
 
             log.info('Building docs...')
-            ctx.invoke(build, rel_source=rel_source, destination=os.path.join(temp_dir, rel_dest))
+            ctx.invoke(build, rel_source=rel_source, destination=os.path.join(work_dir, rel_dest))
             versions = config.pop('versions')
 
             log.info('Attempting to push to branch %s on remote repository.', dest_branch)
             try:
-                if commit_and_push(temp_dir, config.push_remote, versions):
+                if commit_and_push(work_dir, config.push_remote, versions):
                     return
             except GitError as exc:
                 log.error(exc.message)
@@ -1,21 +1,45 @@
 """Interface with git locally and remotely."""
 
+import atexit
 import glob
 import json
 import logging
 import os
+import posixpath
 import re
+import shutil
 import sys
 import tarfile
+import tempfile
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 from subprocess import CalledProcessError, PIPE, Popen, STDOUT
 
+from sphinxcontrib.versioning.lib import iter_tar
+
+ADD_PATHS_PER_COMMAND = 500  # Keeps command lines short enough for Windows.
+BLOB_STORE_BATCH = 1000  # Max blobs read into memory at a time when filling the blob store.
+BLOB_STORE_GRACE = 3600  # Seconds an unlinked file is kept in the blob store, so concurrent exports can link it.
+CLONE_MARKER = 'scv_clone'  # File in .git of repositories created by clone(), which may be updated by later runs.
+EXPORT_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+FETCH_REFSPECS_PER_COMMAND = 500  # Keeps command lines short enough for Windows.
 IS_WINDOWS = sys.platform == 'win32'
+LAST_COMMITTED = dict()  # Cache of last_committed() results keyed by commit SHA, shared between refs.
+LIST_REMOTE = dict()  # Cache of list_remote() results keyed by remote URL. Values are (time, remotes).
 RE_ALL_REMOTES = re.compile(r'([\w./-]+)\t([A-Za-z0-9@:/\\._-]+) \((fetch|push)\)\n')
+RE_REF_NAME = re.compile(r'^[\w./-]+$')
 RE_REMOTE = re.compile(r'^(?P<sha>[0-9a-f]{5,40})\trefs/(?P<kind>heads|tags)/(?P<name>[\w./-]+(?:\^\{})?)$',
                        re.MULTILINE)
-RE_UNIX_TIME = re.compile(r'^\d{10}$', re.MULTILINE)
+RE_CAT_FILE_HEADER = re.compile(br'^([0-9a-f]{40,64}) ([a-z]+) (\d+)$')
+RE_COMMITTER_TIME = re.compile(br'^committer .* (\d+) [+-]\d{4}$', re.MULTILINE)
+RE_LS_TREE_BLOB = re.compile(r'^(\d+) blob ([0-9a-f]{40,64})\t(.+)$', re.DOTALL)
+SESSIONS = dict()  # GitSession instances keyed by local_root, see git_session().
+TAR_DIRECTORY = b'5'
+TAR_FILES = (b'0', b'\0', b'7')
+TAR_HARDLINK = b'1'
+TAR_SYMLINK = b'2'
 WHITELIST_ENV_VARS = (
     'APPVEYOR',
     'APPVEYOR_ACCOUNT_NAME',
@@ -91,25 +115,24 @@ class GitError(Exception):
         super(GitError, self).__init__(message, output)
 
 
-def chunk(iterator, max_size):
-    """Chunk a list/set/etc.
+def git_env(local_root, env_var=True, environ=None):
+    """Build environment variables for git child processes.
 
-    :param iter iterator: The iterable object to chunk.
-    :param int max_size: Max size of each chunk. Remainder chunk may be smaller.
+    :param str local_root: Local path to git root directory.
+    :param bool env_var: Define GIT_DIR environment variable (on non-Windows).
+    :param dict environ: Environment variables to set/override in the command.
 
-    :return: Yield list of items.
-    :rtype: iter
+    :return: Environment variables.
+    :rtype: dict
     """
-    gen = iter(iterator)
-    while True:
-        chunked = list()
-        for i, item in enumerate(gen):
-            chunked.append(item)
-            if i >= max_size - 1:
-                break
-        if not chunked:
-            return
-        yield chunked
+    env = os.environ.copy()
+    if environ:
+        env.update(environ)
+    if env_var and not IS_WINDOWS:
+        env['GIT_DIR'] = os.path.join(local_root, '.git')
+    else:
+        env.pop('GIT_DIR', None)
+    return env
 
 
 def run_command(local_root, command, env_var=True, pipeto=None, retry=0, environ=None):
@@ -128,15 +151,7 @@ def run_command(local_root, command, env_var=True, pipeto=None, retry=0, environ
     :rtype: str
     """
     log = logging.getLogger(__name__)
-
-    # Setup env.
-    env = os.environ.copy()
-    if environ:
-        env.update(environ)
-    if env_var and not IS_WINDOWS:
-        env['GIT_DIR'] = os.path.join(local_root, '.git')
-    else:
-        env.pop('GIT_DIR', None)
+    env = git_env(local_root, env_var, environ)
 
     # Run command.
     with open(os.devnull) as null:
@@ -158,6 +173,157 @@ def run_command(local_root, command, env_var=True, pipeto=None, retry=0, environ
     return main_output
 
 
+class GitSession(object):
+    """Long-lived "git cat-file --batch" and "--batch-check" processes for one repository.
+
+    Every object lookup in a run goes through the same two processes instead of starting git each time. Requests are
+    written from a separate thread while responses are read so neither side blocks on a full pipe.
+
+    :ivar str local_root: Local path to git root directory.
+    """
+
+    def __init__(self, local_root):
+        """Constructor."""
+        self.local_root = local_root
+        self._processes = dict()
+
+    def __enter__(self):
+        """Entering the `with` block."""
+        return self
+
+    def __exit__(self, *_):
+        """Exiting the `with` block."""
+        self.close()
+
+    def _process(self, contents):
+        """Return the running "git cat-file" process, starting it if needed.
+
+        :param bool contents: Process for "git cat-file --batch" instead of "--batch-check".
+
+        :return: Command, Popen instance, and temporary file with its stderr.
+        :rtype: tuple
+        """
+        command = ['git', 'cat-file', '--batch' if contents else '--batch-check']
+        if contents not in self._processes or self._processes[contents][1].poll() is not None:
+            stderr = tempfile.TemporaryFile()
+            main = Popen(command, bufsize=-1, cwd=self.local_root, env=git_env(self.local_root), stdin=PIPE,
+                         stdout=PIPE, stderr=stderr)
+            self._processes[contents] = (command, main, stderr)
+        return self._processes[contents]
+
+    def cat_file(self, objects, contents=True):
+        """Look up many git objects.
+
+        :raise CalledProcessError: Unhandled git command failure.
+
+        :param iter objects: Object names to look up (e.g. a commit SHA or "<commit>:<path>").
+        :param bool contents: Read object contents. Uses "git cat-file --batch-check" if False.
+
+        :return: One tuple per object: (SHA, type, contents as bytes). All None if the object doesn't exist. Contents
+            are None if `contents` is False.
+        :rtype: list
+        """
+        log = logging.getLogger(__name__)
+        objects = list(objects)
+        if not objects:
+            return list()
+        command, main, stderr = self._process(contents)
+
+        # Write requests.
+        def feed():
+            """Write object names to git's stdin."""
+            try:
+                main.stdin.write(''.join(o + '\n' for o in objects).encode('utf-8'))
+                main.stdin.flush()
+            except (IOError, OSError):
+                pass  # Git exited, handled below.
+        writer = threading.Thread(target=feed)
+        writer.daemon = True
+        writer.start()
+
+        # Parse "<sha> <type> <size>\n<contents>\n" or "<object> missing\n" for each object.
+        parsed = list()
+        for _ in objects:
+            header = main.stdout.readline()
+            if not header:
+                break  # Git exited.
+            match = RE_CAT_FILE_HEADER.match(header.rstrip(b'\n'))
+            if not match:
+                parsed.append((None, None, None))
+            elif not contents:
+                parsed.append((match.group(1).decode('ascii'), match.group(2).decode('ascii'), None))
+            else:
+                data = main.stdout.read(int(match.group(3)) + 1)[:-1]
+                parsed.append((match.group(1).decode('ascii'), match.group(2).decode('ascii'), data))
+        writer.join()
+        log.debug(json.dumps(dict(cwd=self.local_root, command=command, objects=len(objects), parsed=len(parsed))))
+
+        # Verify success.
+        if len(parsed) != len(objects):
+            main.wait()
+            stderr.seek(0)
+            output = stderr.read().decode('utf-8')
+            self._processes.pop(contents)
+            stderr.close()
+            raise CalledProcessError(main.poll(), command, output=output)
+
+        return parsed
+
+    def close(self):
+        """Stop all git processes."""
+        for _, main, stderr in self._processes.values():
+            main.stdin.close()
+            if main.poll() is None:
+                try:
+                    main.kill()  # Forked child processes (e.g. Sphinx builds) may still hold stdin open.
+                except OSError:
+                    pass  # Exited already.
+            main.wait()
+            main.stdout.close()
+            stderr.close()
+        self._processes.clear()
+
+
+def git_session(local_root):
+    """Return the GitSession shared by all functions in this module for a repository.
+
+    Only the most recently used repository keeps its processes running.
+
+    :param str local_root: Local path to git root directory.
+
+    :return: Shared session.
+    :rtype: GitSession
+    """
+    if local_root not in SESSIONS:
+        close_sessions()
+        SESSIONS[local_root] = GitSession(local_root)
+    return SESSIONS[local_root]
+
+
+@atexit.register
+def close_sessions():
+    """Stop all git processes of shared sessions."""
+    for session in SESSIONS.values():
+        session.close()
+    SESSIONS.clear()
+
+
+def cat_file(local_root, objects, contents=True):
+    """Look up many git objects through the shared "git cat-file" processes instead of one process per object.
+
+    :raise CalledProcessError: Unhandled git command failure.
+
+    :param str local_root: Local path to git root directory.
+    :param iter objects: Object names to look up (e.g. a commit SHA or "<commit>:<path>").
+    :param bool contents: Read object contents. Uses "git cat-file --batch-check" if False.
+
+    :return: One tuple per object: (SHA, type, contents as bytes). All None if the object doesn't exist. Contents are
+        None if `contents` is False.
+    :rtype: list
+    """
+    return git_session(local_root).cat_file(objects, contents)
+
+
 def get_root(directory):
     """Get root directory of the local git repo from any subdirectory within it.
 
@@ -178,14 +344,14 @@ def get_root(directory):
     return output.strip()
 
 
-def list_remote(local_root):
-    """Get remote branch/tag latest SHAs.
+def _list_remote(local_root):
+    """Get remote branch/tag latest SHAs without caching. See list_remote().
 
     :raise GitError: When git ls-remote fails.
 
     :param str local_root: Local path to git root directory.
 
-    :return: List of tuples containing strings. Each tuple is sha, name, kind.
+    :return: List of lists containing strings. Each list is sha, name, kind.
     :rtype: list
     """
     command = ['git', 'ls-remote', '--heads', '--tags']
@@ -209,6 +375,67 @@ def list_remote(local_root):
     return [[i['sha'], i['name'], i['kind']] for i in parsed]
 
 
+def list_remote(local_root, ttl=0):
+    """Get remote branch/tag latest SHAs.
+
+    :raise GitError: When git ls-remote fails.
+
+    :param str local_root: Local path to git root directory.
+    :param int ttl: Reuse the result of a previous call for the same remote URL if it's younger than this many
+        seconds. 0 disables caching.
+
+    :return: List of tuples containing strings. Each tuple is sha, name, kind.
+    :rtype: list
+    """
+    log = logging.getLogger(__name__)
+    if not ttl:
+        return _list_remote(local_root)
+
+    # Look in cache.
+    try:
+        url = run_command(local_root, ['git', 'ls-remote', '--get-url']).strip()
+    except CalledProcessError as exc:
+        raise GitError('Git failed to get remote URL.', exc.output)
+    timestamp, remotes = LIST_REMOTE.get(url, (0, None))
+    if time.time() - timestamp < ttl:
+        log.debug('Using list of remote refs of %s from %d seconds ago.', url, time.time() - timestamp)
+    else:
+        remotes = _list_remote(local_root)
+        LIST_REMOTE[url] = (time.time(), remotes)
+    return [list(r) for r in remotes]
+
+
+def list_local_refs(local_root, remote='origin'):
+    """Get branch/tag SHAs from the local remote-tracking branches and tags instead of asking the remote.
+
+    Same output as list_remote() if the local repository has just fetched all branches and tags.
+
+    :raise GitError: When git for-each-ref fails.
+
+    :param str local_root: Local path to git root directory.
+    :param str remote: Read branches from this remote's remote-tracking branches.
+
+    :return: Same as list_remote().
+    :rtype: list
+    """
+    prefixes = [('refs/remotes/{0}/'.format(remote), 'heads'), ('refs/tags/', 'tags')]
+    command = ['git', 'for-each-ref', '--format=%(objectname)\t%(*objectname)\t%(refname)'] + [p for p, _ in prefixes]
+    try:
+        output = run_command(local_root, command)
+    except CalledProcessError as exc:
+        raise GitError('Git failed to list local refs.', exc.output)
+
+    # Parse. Annotated tags have the SHA of the tagged commit in the second column.
+    remotes = list()
+    for sha, dereferenced, ref in (l.split('\t') for l in output.splitlines()):
+        prefix, kind = [p for p in prefixes if ref.startswith(p[0])][0]
+        name = ref[len(prefix):]
+        if (kind == 'heads' and name == 'HEAD') or not RE_REF_NAME.match(name):
+            continue
+        remotes.append([dereferenced or sha, name, kind])
+    return remotes
+
+
 def filter_and_date(local_root, conf_rel_paths, commits):
     """Get commit Unix timestamps and first matching conf.py path. Exclude commits with no conf.py file.
 
@@ -222,55 +449,157 @@ def filter_and_date(local_root, conf_rel_paths, commits):
     :return: Commit time (seconds since Unix epoch) for each commit and conf.py path. SHA keys and [int, str] values.
     :rtype: dict
     """
+    commits = list(OrderedDict.fromkeys(commits))
+    conf_rel_paths = [posixpath.normpath(p.replace(os.sep, '/')) for p in conf_rel_paths]
     dates_paths = dict()
 
-    # Filter without docs.
+    # Look up every commit and its candidate conf.py files in one batch.
+    objects = list()
     for commit in commits:
-        if commit in dates_paths:
-            continue
-        command = ['git', 'ls-tree', '--name-only', '-r', commit] + conf_rel_paths
-        try:
-            output = run_command(local_root, command)
-        except CalledProcessError as exc:
-            raise GitError('Git ls-tree failed on {0}'.format(commit), exc.output)
-        if output:
-            dates_paths[commit] = [None, output.splitlines()[0].strip()]
-
-    # Get timestamps by groups of 50.
-    command_prefix = ['git', 'show', '--no-patch', '--pretty=format:%ct']
-    for commits_group in chunk(dates_paths, 50):
-        command = command_prefix + commits_group
-        output = run_command(local_root, command)
-        timestamps = [int(i) for i in RE_UNIX_TIME.findall(output)]
-        for i, commit in enumerate(commits_group):
-            dates_paths[commit][0] = timestamps[i]
+        objects.append('{0}^{{commit}}'.format(commit))
+        objects.extend('{0}:{1}'.format(commit, p) for p in conf_rel_paths)
+    parsed = cat_file(local_root, objects)
+
+    # Filter without docs and get timestamps.
+    step = len(conf_rel_paths) + 1
+    for i, commit in enumerate(commits):
+        kind, contents = parsed[i * step][1:]
+        if kind != 'commit':
+            output = 'fatal: Not a valid commit name {0}\n'.format(commit)
+            raise GitError('Git cat-file failed on {0}'.format(commit), output)
+        found = [p for p, t in zip(conf_rel_paths, parsed[i * step + 1:(i + 1) * step]) if t[1] == 'blob']
+        if found:
+            dates_paths[commit] = [int(RE_COMMITTER_TIME.search(contents).group(1)), found[0]]
 
     # Done.
     return dates_paths
 
 
-def fetch_commits(local_root, remotes):
-    """Fetch from origin.
+def fetch_commits(local_root, remotes, depth=0):
+    """Fetch branches/tags whose commits aren't available locally from origin with one "git fetch".
 
     :raise CalledProcessError: Unhandled git command failure.
 
     :param str local_root: Local path to git root directory.
     :param iter remotes: Output of list_remote().
+    :param int depth: Fetch only this many commits of each branch/tag's history (for shallow clones). 0 is everything.
     """
-    # Fetch all known branches.
-    command = ['git', 'fetch', 'origin']
-    run_command(local_root, command)
+    log = logging.getLogger(__name__)
+    remotes = list(remotes)
+
+    # Find missing commits.
+    found = cat_file(local_root, (r[0] for r in remotes), contents=False)
+    missing = ('refs/{0}/{1}'.format(kind, name) for (_, name, kind), (sha, _, _) in zip(remotes, found) if not sha)
+    refspecs = list(OrderedDict.fromkeys(missing))
+    if not refspecs:
+        return
 
-    # Fetch new branches/tags.
-    for sha, name, kind in remotes:
+    # Fetch.
+    command = ['git', 'fetch'] + (['--depth={0}'.format(depth)] if depth else []) + ['origin']
+    log.debug('Fetching %d branches/tags from origin.', len(refspecs))
+    for i in range(0, len(refspecs), FETCH_REFSPECS_PER_COMMAND):
+        run_command(local_root, command + refspecs[i:i + FETCH_REFSPECS_PER_COMMAND])
+
+    # Verify.
+    for (sha, name, _), (found_sha, _, _) in zip(remotes, cat_file(local_root, (r[0] for r in remotes), False)):
+        if not found_sha:
+            output = 'fatal: {0} ({1}) not found after fetching.\n'.format(sha, name)
+            raise CalledProcessError(128, command, output=output)
+
+
+def _split_stream(stream, separator, size=65536):
+    """Read a binary stream in chunks and yield separated tokens as they become available.
+
+    :param file stream: Binary file object to read from (e.g. git's stdout pipe).
+    :param bytes separator: Token separator.
+    :param int size: Chunk size.
+
+    :return: Yields tokens without the separator. The last token is yielded even if it's not terminated.
+    :rtype: iter
+    """
+    remainder = b''
+    for data in iter(lambda: stream.read(size), b''):
+        tokens = (remainder + data).split(separator)
+        remainder = tokens.pop()
+        for token in tokens:
+            yield token
+    if remainder:
+        yield remainder
+
+
+def last_committed(local_root, commit, paths):
+    """Get the time of the most recent commit that changed each file, walking the commit's history only once.
+
+    Stops walking as soon as all files are found. Results are cached so when walking history shared with a previously
+    walked commit (e.g. a tag on a branch) the remaining files are taken from the cache instead. The cache is only used
+    while no merge commit has been walked, since other parents' commits may be interleaved with the shared history.
+
+    :raise CalledProcessError: Unhandled git command failure.
+
+    :param str local_root: Local path to git root directory.
+    :param str commit: Git commit SHA to start walking history from.
+    :param iter paths: File paths relative to the git root.
+
+    :return: Author date (seconds since Unix epoch) of the last commit that changed each file, keyed by path.
+    :rtype: dict
+    """
+    log = logging.getLogger(__name__)
+    wanted = set(paths)
+    found = dict()
+    command = ['git', 'log', '-z', '--name-only', '--format=%x01%H %at %P', commit]
+
+    # Walk history. Output is "\x01<sha> <time> <parents>\0\n<path>\0<path>\0" for every commit.
+    main = Popen(command, cwd=local_root, env=git_env(local_root), stdout=PIPE, stderr=PIPE)
+    linear, timestamp = True, None
+    for token in (t.lstrip(b'\n') for t in _split_stream(main.stdout, b'\0')):
+        if token.startswith(b'\x01'):
+            header = token[1:].decode('ascii').split(' ', 2)  # SHA, time, parents.
+            timestamp = header[1]
+            if linear:
+                for path, value in LAST_COMMITTED.get(header[0], dict()).items():
+                    if path in wanted and path not in found:
+                        found[path] = value
+            linear = linear and ' ' not in header[2].strip()
+        else:
+            path = token.decode('utf-8')
+            if path in wanted and path not in found:
+                found[path] = int(timestamp)
+        if len(found) == len(wanted):
+            main.kill()
+            break
+    main.stdout.close()
+    stderr = main.stderr.read().decode('utf-8')
+    main.stderr.close()
+    main.wait()
+    log.debug(json.dumps(dict(cwd=local_root, command=command, code=main.poll(), found=len(found))))
+    if main.poll() != 0 and len(found) != len(wanted):
+        raise CalledProcessError(main.poll(), command, output=stderr)
+
+    LAST_COMMITTED[commit] = found
+    return found
+
+
+def _extract_links(target, links):
+    """Create links from a tar archive after all files were extracted. Links to missing files are skipped.
+
+    Hard links are copied. Symlinks are copied too if they aren't supported.
+
+    :param str target: Directory the archive was extracted to.
+    :param iter links: List of tuples (type, path, linkname) for each link.
+    """
+    for kind, path, linkname in (i for i in links if os.path.exists(os.path.join(target, i[2]))):
+        if os.path.lexists(path):
+            os.remove(path)
+        if kind == TAR_HARDLINK:
+            shutil.copy2(os.path.join(target, linkname), path)
+            continue
         try:
-            run_command(local_root, ['git', 'reflog', sha])
-        except CalledProcessError:
-            run_command(local_root, command + ['refs/{0}/{1}'.format(kind, name)])
-            run_command(local_root, ['git', 'reflog', sha])
+            os.symlink(linkname, path)
+        except (AttributeError, NotImplementedError, OSError):  # No symlink support, copy instead.
+            shutil.copy2(os.path.join(os.path.dirname(path), linkname), path)
 
 
-def export(local_root, commit, target):
+def export(local_root, commit, target, paths=None):
     """Export git commit to directory. "Extracts" all files at the commit to the target directory.
 
     Set mtime of RST files to last commit date.
@@ -280,56 +609,262 @@ def export(local_root, commit, target):
     :param str local_root: Local path to git root directory.
     :param str commit: Git commit SHA to export.
     :param str target: Directory to export to.
+    :param iter paths: Only export these files/directories (relative to git root, must exist in the commit). Default
+        is everything.
     """
     log = logging.getLogger(__name__)
     target = os.path.realpath(target)
+    if not os.path.isdir(target):
+        os.makedirs(target)
+    fresh = not os.listdir(target)  # No existing symlinks to follow, a lexical check of tar paths is enough.
     mtimes = list()
 
+    def resolve(name):
+        """Return where a tar object goes in the target directory.
+
+        :param str name: Path of the object in the tar archive.
+
+        :return: Path in the target directory or None if it's outside of it.
+        :rtype: str
+        """
+        if fresh:
+            name = posixpath.normpath(name)
+            if name.startswith('/') or name == '..' or name.startswith('../'):
+                return None
+            return os.path.join(target, *name.split('/'))
+        path = os.path.realpath(os.path.join(target, name))
+        return path if path == target or path.startswith(target + os.sep) else None
+
     # Define extract function.
     def extract(stdout):
         """Extract tar archive from "git archive" stdout.
 
         :param file stdout: Handle to git's stdout pipe.
         """
+        debug = log.isEnabledFor(logging.DEBUG)
+        directories = {target}  # Directories known to exist.
         queued_links = list()
         try:
-            with tarfile.open(fileobj=stdout, mode='r|') as tar:
-                for info in tar:
-                    log.debug('name: %s; mode: %d; size: %s; type: %s', info.name, info.mode, info.size, info.type)
-                    path = os.path.realpath(os.path.join(target, info.name))
-                    if not path.startswith(target):  # Handle bad paths.
-                        log.warning('Ignoring tar object path %s outside of target directory.', info.name)
-                    elif info.isdir():  # Handle directories.
-                        if not os.path.exists(path):
-                            os.makedirs(path, mode=info.mode)
-                    elif info.issym() or info.islnk():  # Queue links.
-                        queued_links.append(info)
-                    else:  # Handle files.
-                        tar.extract(member=info, path=target)
-                        if os.path.splitext(info.name)[1].lower() == '.rst':
-                            mtimes.append(info.name)
-                for info in (i for i in queued_links if os.path.exists(os.path.join(target, i.linkname))):
-                    tar.extract(member=info, path=target)
+            for name, kind, mode, mtime, linkname, data in iter_tar(stdout):
+                if debug:
+                    log.debug('name: %s; mode: %d; type: %s', name, mode, kind)
+                path = resolve(name)
+                if path is None:  # Handle bad paths.
+                    log.warning('Ignoring tar object path %s outside of target directory.', name)
+                elif kind == TAR_DIRECTORY:  # Handle directories.
+                    if path not in directories and not os.path.isdir(path):
+                        os.makedirs(path, mode)
+                    directories.add(path)
+                elif kind in (TAR_SYMLINK, TAR_HARDLINK):  # Queue links.
+                    queued_links.append((kind, path, linkname))
+                elif kind in TAR_FILES:  # Handle files.
+                    parent = os.path.dirname(path)
+                    if parent not in directories and not os.path.isdir(parent):
+                        os.makedirs(parent)
+                    directories.add(parent)
+                    with os.fdopen(os.open(path, EXPORT_OPEN_FLAGS, mode), 'wb') as handle:
+                        for chunk in data():
+                            handle.write(chunk)
+                    os.utime(path, (mtime, mtime))
+                    if os.path.splitext(name)[1].lower() == '.rst':
+                        mtimes.append(name)
+            _extract_links(target, queued_links)
         except tarfile.TarError as exc:
             log.debug('Failed to extract output from "git archive" command: %s', str(exc))
 
     # Run command.
-    run_command(local_root, ['git', 'archive', '--format=tar', commit], pipeto=extract)
+    command = ['git', 'archive', '--format=tar', commit]
+    paths = [p for p in paths or () if p]
+    if paths:
+        command += ['--'] + paths
+    run_command(local_root, command, pipeto=extract)
 
     # Set mtime.
-    for file_path in mtimes:
-        last_committed = int(run_command(local_root, ['git', 'log', '-n1', '--format=%at', commit, '--', file_path]))
-        os.utime(os.path.join(target, file_path), (last_committed, last_committed))
+    for file_path, timestamp in last_committed(local_root, commit, mtimes).items():
+        os.utime(os.path.join(target, file_path), (timestamp, timestamp))
+
+
+def export_linked(local_root, commit, target, store, paths=None):
+    """Export git commit to directory by hard linking files from a content-addressed blob store.
+
+    Each git blob is written to the store only once and linked into every exported tree that has it, so disk writes
+    scale with unique file contents instead of refs times files. All links to a file share one mtime: RST files get
+    the date of their last commit like export() does and that date is part of their name in the store. Other files
+    keep the commit date of the first export that wrote them. Files are copied if hard links aren't supported (e.g.
+    store and target on different file systems).
+
+    Exported files must not be modified in place since that would change them in every tree linked to the store.
+
+    :raise CalledProcessError: Unhandled git command failure.
+
+    :param str local_root: Local path to git root directory.
+    :param str commit: Git commit SHA to export.
+    :param str target: Empty or missing directory to export to.
+    :param str store: Blob store directory, created if missing.
+    :param iter paths: Only export these files/directories (relative to git root, must exist in the commit). Default
+        is everything.
+    """
+    log = logging.getLogger(__name__)
+    files = _list_blobs(local_root, commit, store, paths)
+
+    # Write missing blobs to the store.
+    missing = list(OrderedDict((f[3], f) for f in files if f[0] != '120000' and not os.path.isfile(f[3])).values())
+    log.debug('Writing %d of %d files of %s to blob store %s', len(missing), len(files), commit, store)
+    for i in range(0, len(missing), BLOB_STORE_BATCH):
+        _store_blobs(local_root, missing[i:i + BLOB_STORE_BATCH])
+
+    # Link files into the target directory.
+    _link_blobs(local_root, target, files)
+
+
+def _list_blobs(local_root, commit, store, paths):
+    """List files in a commit and name them in the blob store after their contents, mode and (for RST files) mtime.
+
+    :raise CalledProcessError: Unhandled git command failure.
+
+    :param str local_root: Local path to git root directory.
+    :param str commit: Git commit SHA.
+    :param str store: Blob store directory.
+    :param iter paths: Only list these files/directories. Default is everything.
+
+    :return: List of tuples (mode, sha, path, stored, mtime) for each file. Submodules are skipped.
+    :rtype: list
+    """
+    command = ['git', 'ls-tree', '-r', '-z', '--full-tree', commit, '--'] + [p for p in paths or () if p]
+    entries = [RE_LS_TREE_BLOB.match(e) for e in run_command(local_root, command).split('\0')]
+    entries = [e.groups() for e in entries if e]  # Skip submodules.
+    committed = int(RE_COMMITTER_TIME.search(cat_file(local_root, [commit])[0][2]).group(1))
+    mtimes = last_committed(local_root, commit, [e[2] for e in entries if os.path.splitext(e[2])[1].lower() == '.rst'])
+    files = list()
+    for mode, sha, path in entries:
+        name = '{0}.{1}.{2}'.format(sha[2:], mode, mtimes[path]) if path in mtimes else '{0}.{1}'.format(sha[2:], mode)
+        files.append((mode, sha, path, os.path.join(store, sha[:2], name), mtimes.get(path, committed)))
+    return files
+
+
+def _store_blobs(local_root, files):
+    """Write blobs to the blob store, renaming each into place so concurrent exports never link partial files.
+
+    :param str local_root: Local path to git root directory.
+    :param iter files: List of tuples from _list_blobs().
+    """
+    for (mode, _, _, stored, mtime), (_, _, contents) in zip(files, cat_file(local_root, (f[1] for f in files))):
+        if not os.path.isdir(os.path.dirname(stored)):
+            os.makedirs(os.path.dirname(stored))
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(stored))
+        with os.fdopen(handle, 'wb') as temp_file:
+            temp_file.write(contents)
+        os.chmod(temp_path, 0o755 if mode == '100755' else 0o644)
+        os.utime(temp_path, (mtime, mtime))
+        try:
+            os.rename(temp_path, stored)
+        except OSError:  # Windows doesn't replace existing files. Another process just wrote the same blob.
+            os.remove(temp_path)
+            if not os.path.isfile(stored):
+                raise
+
+
+def _link_blobs(local_root, target, files):
+    """Hard link files from the blob store into an exported tree and create symlinks.
+
+    Files are copied if hard links (or symlinks) aren't supported. Broken symlinks are skipped like export() does.
+
+    :param str local_root: Local path to git root directory.
+    :param str target: Directory to export to.
+    :param iter files: List of tuples from _list_blobs().
+    """
+    symlinks = [f for f in files if f[0] == '120000']
+    symlinks = [(f[2], c) for f, (_, _, c) in zip(symlinks, cat_file(local_root, (f[1] for f in symlinks)))]
+    for _, _, path, stored, _ in (f for f in files if f[0] != '120000'):
+        destination = os.path.join(target, *path.split('/'))
+        if not os.path.isdir(os.path.dirname(destination)):
+            os.makedirs(os.path.dirname(destination))
+        try:
+            os.link(stored, destination)
+        except (AttributeError, OSError):  # No hard link support, copy instead.
+            shutil.copy2(stored, destination)
+    for path, contents in symlinks:
+        destination = os.path.join(target, *path.split('/'))
+        linkname = contents.decode('utf-8')
+        if not os.path.exists(os.path.join(os.path.dirname(destination), linkname)):
+            continue
+        if not os.path.isdir(os.path.dirname(destination)):
+            os.makedirs(os.path.dirname(destination))
+        try:
+            os.symlink(linkname, destination)
+        except (AttributeError, NotImplementedError, OSError):  # No symlink support, copy instead.
+            shutil.copy2(os.path.join(os.path.dirname(destination), linkname), destination)
+
+
+def prune_store(store):
+    """Remove files from the blob store that aren't linked into any exported tree anymore.
+
+    Files changed (written, linked or unlinked) in the last BLOB_STORE_GRACE seconds are kept, another process sharing
+    the store may have just written them and not linked them yet.
+
+    :param str store: Blob store directory.
+
+    :return: Number of removed files.
+    :rtype: int
+    """
+    removed = 0
+    oldest = time.time() - BLOB_STORE_GRACE
+    for directory, _, names in os.walk(store):
+        for path in (os.path.join(directory, n) for n in names):
+            stat = os.stat(path)
+            if stat.st_nlink == 1 and stat.st_ctime < oldest:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def _update_clone(new_root, url, branch):
+    """Update a clone left by a previous run. Discards all local changes and untracked files.
+
+    :raise CalledProcessError: Unhandled git command failure.
+    :raise GitError: Handled git failures.
+
+    :param str new_root: Local path to the clone.
+    :param str url: Remote repo URL to fetch from.
+    :param str branch: Fetch and check out this branch.
+    """
+    try:
+        run_command(new_root, ['git', 'fetch', '--depth=1', url, 'refs/heads/' + branch])
+    except CalledProcessError as exc:
+        raise GitError('Failed to fetch from remote repo URL.', exc.output)
+    run_command(new_root, ['git', 'checkout', '--force', '-B', branch, 'FETCH_HEAD'])
+    run_command(new_root, ['git', 'clean', '-d', '--force', '-x'])
+
+
+def _copy_remotes(new_root, remotes):
+    """Add remotes to a clone or update their URLs.
+
+    :raise GitError: Handled git failures.
+
+    :param str new_root: Local path to the clone.
+    :param dict remotes: Fetch and push URLs keyed by remote name.
+    """
+    existing = set(run_command(new_root, ['git', 'remote']).split())
+    for name, (fetch, push) in remotes.items():
+        try:
+            run_command(new_root, ['git', 'remote', 'set-url' if name in existing else 'add', name, fetch], retry=3)
+            run_command(new_root, ['git', 'remote', 'set-url', '--push', name, push], retry=3)
+        except CalledProcessError as exc:
+            raise GitError('Failed to set git remote URL.', exc.output)
 
 
 def clone(local_root, new_root, remote, branch, rel_dest, exclude):
     """Clone "local_root" origin into a new directory and check out a specific branch. Optionally run "git rm".
 
+    Clones are marked. A marked clone left in the directory by a previous run is updated instead: only the branch's
+    latest commit is fetched and checked out, discarding all local changes and untracked files. Other git repositories
+    are never touched.
+
     :raise CalledProcessError: Unhandled git command failure.
     :raise GitError: Handled git failures.
 
     :param str local_root: Local path to git root directory.
-    :param str new_root: Local path empty directory in which branch will be cloned into.
+    :param str new_root: Local path empty directory in which branch will be cloned into (or a previous clone).
     :param str remote: The git remote to clone from to.
     :param str branch: Checkout this branch.
     :param str rel_dest: Run "git rm" on this directory if exclude is truthy.
@@ -349,11 +884,19 @@ def clone(local_root, new_root, remote, branch, rel_dest, exclude):
     if remote not in remotes:
         raise GitError('Git repo missing remote "{}".'.format(remote), output)
 
-    # Clone.
-    try:
-        run_command(new_root, ['git', 'clone', remotes[remote][0], '--depth=1', '--branch', branch, '.'])
-    except CalledProcessError as exc:
-        raise GitError('Failed to clone from remote repo URL.', exc.output)
+    # Clone, or update the clone from a previous run.
+    if os.path.isfile(os.path.join(new_root, '.git', CLONE_MARKER)):
+        log.debug('Updating existing clone in %s', new_root)
+        _update_clone(new_root, remotes[remote][0], branch)
+    elif os.path.exists(os.path.join(new_root, '.git')):
+        raise GitError('Refusing to update git repository not cloned by sphinx-versioning: {}'.format(new_root),
+                       'Use an empty or missing directory instead.')
+    else:
+        try:
+            run_command(new_root, ['git', 'clone', remotes[remote][0], '--depth=1', '--branch', branch, '.'])
+        except CalledProcessError as exc:
+            raise GitError('Failed to clone from remote repo URL.', exc.output)
+        open(os.path.join(new_root, '.git', CLONE_MARKER), 'w').close()
 
     # Make sure user didn't select a tag as their DEST_BRANCH.
     try:
@@ -362,12 +905,7 @@ def clone(local_root, new_root, remote, branch, rel_dest, exclude):
         raise GitError('Specified branch is not a real branch.', exc.output)
 
     # Copy all remotes from original repo.
-    for name, (fetch, push) in remotes.items():
-        try:
-            run_command(new_root, ['git', 'remote', 'set-url' if name == 'origin' else 'add', name, fetch], retry=3)
-            run_command(new_root, ['git', 'remote', 'set-url', '--push', name, push], retry=3)
-        except CalledProcessError as exc:
-            raise GitError('Failed to set git remote URL.', exc.output)
+    _copy_remotes(new_root, remotes)
 
     # Done if no exclude.
     if not exclude:
@@ -393,6 +931,8 @@ def clone(local_root, new_root, remote, branch, rel_dest, exclude):
 def commit_and_push(local_root, remote, versions):
     """Commit changed, new, and deleted files in the repo and attempt to push the branch to the remote repository.
 
+    Only files whose contents differ from HEAD are staged instead of the whole repository.
+
     :raise CalledProcessError: Unhandled git command failure.
     :raise GitError: Conflicting changes made in remote by other client and bad git config for commits.
 
@@ -405,29 +945,26 @@ def commit_and_push(local_root, remote, versions):
     """
     log = logging.getLogger(__name__)
     current_branch = run_command(local_root, ['git', 'rev-parse', '--abbrev-ref', 'HEAD']).strip()
-    run_command(local_root, ['git', 'add', '.'])
 
-    # Check if there are no changes.
-    try:
-        run_command(local_root, ['git', 'diff', 'HEAD', '--no-ext-diff', '--quiet', '--exit-code'])
-    except CalledProcessError:
-        pass  # Repo is dirty, something has changed.
-    else:
+    # List files that differ from HEAD. Git only hashes files whose size/mtime changed since the clone.
+    run_command(local_root, ['git', 'reset', '--quiet'])  # Unstage "git rm" from clone(), index matches HEAD again.
+    output = run_command(local_root, ['git', 'status', '--porcelain', '-z', '--untracked-files=all', '--no-renames'])
+    changed = [(e[:2].strip(), e[3:]) for e in output.split('\0') if e]
+    if not changed:
         log.info('No changes to commit.')
         return True
 
-    # Check if there are changes excluding those files that always change.
-    output = run_command(local_root, ['git', 'diff', 'HEAD', '--no-ext-diff', '--name-status'])
-    for status, name in (l.split('\t', 1) for l in output.splitlines()):
-        if status != 'M':
-            break  # Only looking for modified files.
-        components = name.split('/')
-        if '.doctrees' not in components and components[-1] != 'searchindex.js':
-            break  # Something other than those two dirs/files has changed.
-    else:
+    # Check if there are changes excluding search indexes, which always change.
+    if all(c[0] == 'M' and c[1].split('/')[-1] == 'searchindex.js' for c in changed):
         log.info('No significant changes to commit.')
         return True
 
+    # Stage only changed files.
+    log.debug('Staging %d changed files.', len(changed))
+    for i in range(0, len(changed), ADD_PATHS_PER_COMMAND):
+        run_command(local_root, ['git', '--literal-pathspecs', 'add', '--all', '--'] +
+                    [c[1] for c in changed[i:i + ADD_PATHS_PER_COMMAND]])
+
     # Commit.
     latest_commit = sorted(versions.remotes, key=lambda v: v['date'])[-1]
     commit_message_file = os.path.join(local_root, '_scv_commit_message.txt')
@@ -5,11 +5,17 @@ import functools
 import logging
 import os
 import shutil
+import tarfile
 import tempfile
 import weakref
 
 import click
 
+TAR_BLOCK = 512  # Size of tar headers and padding of tar contents.
+TAR_BUFFER_SIZE = 1024 * 1024  # Max bytes read from a tar archive at a time when reading one object's contents.
+TAR_PAX_GLOBAL = b'g'
+TAR_PAX_NEXT = b'x'
+
 
 class Config(object):
     """The global configuration and state of the running program."""
@@ -22,23 +28,33 @@ class Config(object):
         # Booleans.
         self.banner_greatest_tag = False
         self.banner_recent_tag = False
+        self.export_docs_only = False
         self.greatest_tag = False
+        self.hardlink_exports = False
+        self.incremental = False
         self.invert = False
+        self.local_refs = False
         self.no_colors = False
         self.no_local_conf = False
         self.recent_tag = False
         self.show_banner = False
+        self.validate = False
+        self.versions_json = False
 
         # Strings.
         self.banner_main_ref = 'master'
+        self.cache_dir = None
         self.chdir = None
+        self.clone_dir = None
         self.git_root = None
         self.local_conf = None
         self.priority = None
         self.push_remote = 'origin'
         self.root_ref = 'master'
+        self.validate_summary = None
 
         # Tuples.
+        self.export_include = tuple()
         self.grm_exclude = tuple()
         self.overflow = tuple()
         self.sort = tuple()
@@ -46,6 +62,10 @@ class Config(object):
         self.whitelist_tags = tuple()
 
         # Integers.
+        self.cache_limit = 50
+        self.fetch_depth = 0
+        self.jobs = 1
+        self.ls_remote_ttl = 0
         self.verbose = 0
 
     def __contains__(self, item):
@@ -167,3 +187,108 @@ class TempDir(object):
         shutil.rmtree(self.name, onerror=lambda *a: os.chmod(a[1], __import__('stat').S_IWRITE) or os.unlink(a[1]))
         if os.path.exists(self.name):
             raise IOError(17, "File exists: '{}'".format(self.name))
+
+
+def _parse_pax(data):
+    """Parse the records of a pax extended header ("<length> <key>=<value>\\n" each).
+
+    :raise tarfile.HeaderError: On invalid records.
+
+    :param bytes data: Contents of the extended header.
+
+    :return: Values keyed by keyword.
+    :rtype: dict
+    """
+    pax = dict()
+    while data:
+        length, _, rest = data.partition(b' ')
+        try:
+            record, data = rest[:int(length) - len(length) - 2], rest[int(length) - len(length) - 1:]
+        except ValueError:
+            raise tarfile.HeaderError('invalid pax header')
+        key, _, value = record.partition(b'=')
+        pax[key.decode('utf-8')] = value.decode('utf-8', 'replace')
+    return pax
+
+
+def iter_tar(stream):
+    """Read an uncompressed tar archive (ustar with pax extended headers, as written by "git archive") as a stream.
+
+    Much faster than the tarfile module for archives with many small files.
+
+    :raise tarfile.TarError: On invalid or truncated data.
+
+    :param file stream: Binary file object to read from (e.g. git's stdout pipe).
+
+    :return: Yields (name, type, mode, mtime, linkname, data) for each object. `data` is a function returning an
+        iterator of the object's contents in chunks. Unread contents are skipped when the next object is read.
+    :rtype: iter
+    """
+    def read(size):
+        """Read exactly `size` bytes.
+
+        :param int size: Number of bytes.
+
+        :return: Data.
+        :rtype: bytes
+        """
+        data = stream.read(size)
+        if len(data) != size:
+            raise tarfile.ReadError('unexpected end of data')
+        return data
+
+    def number(field):
+        """Parse an octal number field.
+
+        :param bytes field: Field from the header.
+
+        :return: Parsed number.
+        :rtype: int
+        """
+        try:
+            return int(field.strip(b'\0 ') or b'0', 8)
+        except ValueError:
+            raise tarfile.HeaderError('invalid number field')
+
+    pax = dict()
+    while True:
+        header = stream.read(TAR_BLOCK)
+        if not header or header == b'\0' * TAR_BLOCK:
+            return  # End of archive.
+        if len(header) != TAR_BLOCK:
+            raise tarfile.ReadError('unexpected end of data')
+        if number(header[148:156]) != sum(bytearray(header[:148] + b' ' * 8 + header[156:])):
+            raise tarfile.HeaderError('bad checksum')
+        kind, size = header[156:157], number(header[124:136])
+        size = int(pax.get('size', size))
+        padding = -size % TAR_BLOCK
+
+        # Extended headers apply to the next object.
+        if kind in (TAR_PAX_GLOBAL, TAR_PAX_NEXT):
+            pax_data = read(size + padding)[:size]
+            if kind == TAR_PAX_NEXT:
+                pax = _parse_pax(pax_data)
+            continue
+
+        # Yield object.
+        name = header[0:100].split(b'\0', 1)[0]
+        if header[257:262] == b'ustar' and header[345:346] != b'\0':  # Long names are split into prefix and name.
+            name = header[345:500].split(b'\0', 1)[0] + b'/' + name
+        name = pax.get('path') or name.decode('utf-8', 'replace')
+        linkname = pax.get('linkpath') or header[157:257].split(b'\0', 1)[0].decode('utf-8', 'replace')
+        mtime = int(float(pax['mtime'])) if 'mtime' in pax else number(header[136:148])
+        remaining = [size]
+
+        def data():
+            """Yield contents of the current object in chunks."""
+            while remaining[0]:
+                chunk = read(min(remaining[0], TAR_BUFFER_SIZE))
+                remaining[0] -= len(chunk)
+                yield chunk
+
+        yield name.rstrip('/'), kind, number(header[100:108]) & 0o7777, mtime, linkname, data
+        for _ in data():
+            pass  # Skip unread contents.
+        if padding:
+            read(padding)
+        pax = dict()
@@ -1,21 +1,39 @@
 """Functions that perform main tasks. Code is here instead of in __main__.py."""
 
+import hashlib
 import json
 import logging
 import os
 import re
+import shutil
 import subprocess
+import tempfile
+import time
 
-from sphinxcontrib.versioning.git import export, fetch_commits, filter_and_date, GitError, list_remote
-from sphinxcontrib.versioning.lib import Config, HandledError, TempDir
-from sphinxcontrib.versioning.sphinx_ import build, read_config
+import click
 
+from sphinxcontrib.versioning import __version__
+from sphinxcontrib.versioning.git import (cat_file, export, export_linked, fetch_commits, filter_and_date, GitError,
+                                          list_local_refs, list_remote, prune_store)
+from sphinxcontrib.versioning.lib import Config, HandledError, TempDir
+from sphinxcontrib.versioning.sphinx_ import build, build_many, read_config, read_configs, VERSIONS_JSON_FILE
+
+CACHE_BLOBS_DIR = 'blobs'
+CACHE_DOCTREES_DIR = 'doctrees'
+CACHE_GRACE = 3600  # Seconds before unused exports may be evicted from the cache directory, also partial ones.
+CACHE_TEMP_PREFIX = '.tmp_'
+CONF_POSITIVE_INTS = ('cache_limit', 'fetch_depth', 'jobs', 'ls_remote_ttl')  # Checked like click.IntRange(min=1).
+MANIFEST_FILE = '.scv_manifest.json'
+RE_DOCTREES_DIR = re.compile(r'_[0-9a-f]{7}(_root)?$')
+RE_EXPORT_DIR = re.compile(r'^[0-9a-f]{40}([0-9a-f]{24})?$')  # SHA-1 or SHA-256 hex digests.
 RE_INVALID_FILENAME = re.compile(r'[^0-9A-Za-z.-]')
 
 
 def read_local_conf(local_conf):
     """Search for conf.py in any rel_source directory in CWD and if found read it and return.
 
+    :raise click.BadParameter: On invalid values of integer settings, same as their command line options.
+
     :param str local_conf: Path to conf.py to read.
 
     :return: Loaded conf.py.
@@ -31,8 +49,17 @@ def read_local_conf(local_conf):
         log.warning('Unable to read file, continuing with only CLI args.')
         return dict()
 
-    # Filter and return.
-    return {k[4:]: v for k, v in config.items() if k.startswith('scv_') and not k[4:].startswith('_')}
+    # Filter.
+    config = {k[4:]: v for k, v in config.items() if k.startswith('scv_') and not k[4:].startswith('_')}
+
+    # Validate and return. Command line options are validated by click, conf.py values skip that.
+    for key in (k for k in CONF_POSITIVE_INTS if k in config):
+        try:
+            config[key] = click.IntRange(min=1).convert(config[key], None, None)
+        except click.BadParameter as exc:
+            exc.param_hint = 'scv_' + key
+            raise
+    return config
 
 
 def gather_git_info(root, conf_rel_paths, whitelist_branches, whitelist_tags):
@@ -49,11 +76,16 @@ def gather_git_info(root, conf_rel_paths, whitelist_branches, whitelist_tags):
     :rtype: list
     """
     log = logging.getLogger(__name__)
+    config = Config.from_context()
 
     # List remote.
-    log.info('Getting list of all remote branches/tags...')
     try:
-        remotes = list_remote(root)
+        if config.local_refs:
+            log.info('Getting list of all remote branches/tags from local remote-tracking branches and tags...')
+            remotes = list_local_refs(root)
+        else:
+            log.info('Getting list of all remote branches/tags...')
+            remotes = list_remote(root, config.ls_remote_ttl)
     except GitError as exc:
         log.error(exc.message)
         log.error(exc.output)
@@ -66,7 +98,7 @@ def gather_git_info(root, conf_rel_paths, whitelist_branches, whitelist_tags):
             dates_paths = filter_and_date(root, conf_rel_paths, (i[0] for i in remotes))
         except GitError:
             log.info('Need to fetch from remote...')
-            fetch_commits(root, remotes)
+            fetch_commits(root, remotes, config.fetch_depth)
             try:
                 dates_paths = filter_and_date(root, conf_rel_paths, (i[0] for i in remotes))
             except GitError as exc:
@@ -97,39 +129,259 @@ def gather_git_info(root, conf_rel_paths, whitelist_branches, whitelist_tags):
     return whitelisted_remotes
 
 
+def export_cached(local_root, sha, target, paths, store=None):
+    """Export commit into a persistent cache directory unless it's already there.
+
+    Files are exported into a temporary directory within the cache directory and then renamed to the target, so
+    other processes sharing the cache never see a partially exported tree. If another process wins the race its copy
+    is kept.
+
+    :param str local_root: Local path to git root directory.
+    :param str sha: Git commit SHA to export.
+    :param str target: Final directory in the cache directory (named after the tree hash).
+    :param iter paths: Only export these files/directories. Passed to export().
+    :param str store: Hard link files from this blob store with export_linked() instead of extracting them.
+
+    :return: If the cache already had the export.
+    :rtype: bool
+    """
+    if os.path.isdir(target):
+        os.utime(target, None)  # Mark as recently used.
+        return True
+    temp_dir = tempfile.mkdtemp(prefix=CACHE_TEMP_PREFIX, dir=os.path.dirname(target))
+    try:
+        if store:
+            export_linked(local_root, sha, temp_dir, store, paths)
+        else:
+            export(local_root, sha, temp_dir, paths)
+        os.rename(temp_dir, target)
+    except OSError:
+        if not os.path.isdir(target):
+            raise
+    finally:
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+    return False
+
+
+def doctrees_dir(exported_root, remote, root=False):
+    """Return the directory holding Sphinx doctrees and the pickled environment for a ref.
+
+    Doctrees are kept next to the exported trees (in the cache directory or the temporary directory) so they're never
+    written into the destination and pushed.
+
+    Sphinx discards the pickled environment when the source directory path changes (a new git tree hash) so it's
+    reused only for unchanged refs. Dates of exported files come from commit dates, which can't be trusted to tell
+    Sphinx which files changed between two different trees. The root ref's build has its own directory since each
+    build consumes the list of changed documents in the pickled environment.
+
+    :param str exported_root: Tempdir (or cache directory) path returned by pre_build().
+    :param dict remote: Remote from Versions.remotes.
+    :param bool root: Directory for the root ref's build in the web root.
+
+    :return: Directory path (may not exist yet).
+    :rtype: str
+    """
+    name = '{0}_{1}'.format(RE_INVALID_FILENAME.sub('_', remote['id']),
+                            hashlib.sha1(remote['id'].encode('utf-8')).hexdigest()[:7])
+    if root:
+        name += '_root'
+    path = os.path.join(os.path.abspath(exported_root), CACHE_DOCTREES_DIR, name)
+    if os.path.isdir(path):
+        os.utime(path, None)  # Mark as recently used.
+    return path
+
+
+def prune_cache(cache_dir, keep, limit, pattern=RE_EXPORT_DIR):
+    """Remove least recently used exports from the cache directory until at most `limit` remain.
+
+    Only subdirectories named like exports are considered, other files in the cache directory are left alone. Files in
+    the blob store only used by removed exports are removed too. Partial exports left by killed runs are removed once
+    they haven't changed for CACHE_GRACE seconds.
+
+    Exports used in the last CACHE_GRACE seconds are never removed, other processes sharing the cache directory may
+    still be building them. The limit may be exceeded until then.
+
+    :param str cache_dir: Cache directory with exported trees as subdirectories.
+    :param iter keep: Never remove these subdirectories (used by the current build).
+    :param int limit: Maximum number of exported trees to keep.
+    :param pattern: Compiled regex subdirectory names must match to be removed.
+
+    :return: Removed subdirectory names.
+    :rtype: list
+    """
+    log = logging.getLogger(__name__)
+    keep = set(keep)
+    candidates = list()
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path):
+            continue
+        if name.startswith(CACHE_TEMP_PREFIX) and os.path.getmtime(path) < time.time() - CACHE_GRACE:
+            log.debug('Removing abandoned partial export from cache: %s', name)
+            shutil.rmtree(path, ignore_errors=True)
+        elif name not in keep and pattern.search(name):
+            candidates.append((os.path.getmtime(path), name))
+    excess = len(candidates) + len(keep) - limit
+    if excess <= 0:
+        return list()
+    removed = [n for t, n in sorted(candidates)[:excess] if t < time.time() - CACHE_GRACE]
+    for name in removed:
+        log.debug('Removing least recently used export from cache: %s', name)
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+    if os.path.isdir(os.path.join(cache_dir, CACHE_BLOBS_DIR)):
+        log.debug('Removed %d unused files from blob store.', prune_store(os.path.join(cache_dir, CACHE_BLOBS_DIR)))
+    return removed
+
+
+def prune_doctrees(exported_root, versions, root_ref, limit):
+    """Remove least recently used doctrees directories of refs not in the current build.
+
+    :param str exported_root: Cache directory path returned by pre_build().
+    :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
+    :param str root_ref: Branch/tag built in the web root.
+    :param int limit: Maximum number of doctrees directories to keep.
+    """
+    doctrees_root = os.path.join(exported_root, CACHE_DOCTREES_DIR)
+    if not os.path.isdir(doctrees_root):
+        return
+    keep = [os.path.basename(doctrees_dir(exported_root, r)) for r in versions.remotes]
+    keep.append(os.path.basename(doctrees_dir(exported_root, versions[root_ref], True)))
+    prune_cache(doctrees_root, keep, limit, RE_DOCTREES_DIR)
+
+
+def _tree_keys(local_root, versions, config):
+    """Get the git tree hashes of everything to export and set them as the "tree" key of all remotes.
+
+    :param str local_root: Local path to git root directory.
+    :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
+    :param sphinxcontrib.versioning.lib.Config config: Runtime configuration.
+
+    :return: Commit SHA and paths to export, keyed by export directory name.
+    :rtype: dict
+    """
+    includes = [os.path.normpath(p).replace(os.sep, '/').strip('/') for p in config.export_include]
+    includes = ['' if p == '.' else p for p in includes]
+    paths = dict()
+    for remote in versions.remotes:
+        if config.export_docs_only or includes:
+            docs_dir = remote['conf_rel_path'].rpartition('/')[0]
+            paths[remote['id']] = [docs_dir] + [p for p in includes if p != docs_dir]
+            if '' in paths[remote['id']]:
+                paths[remote['id']] = ['']  # conf.py in git root, export everything.
+        else:
+            paths[remote['id']] = ['']
+    objects = ('{0}:{1}'.format(r['sha'], p) for r in versions.remotes for p in paths[r['id']])
+    trees = iter(cat_file(local_root, objects, contents=False))
+    exports = dict()
+    for remote in versions.remotes:
+        found = [(p, t[0]) for p, t in zip(paths[remote['id']], trees) if t[0]]  # Skip includes missing in commit.
+        if [f[0] for f in found] == ['']:
+            tree = found[0][1]
+        else:  # Include paths in the key, identical subtrees may be at different paths in other commits.
+            tree = hashlib.sha1(''.join('{0} {1}\n'.format(*f) for f in found).encode('utf-8')).hexdigest()
+        remote['tree'] = tree
+        exports.setdefault(tree, (remote['sha'], [f[0] for f in found]))
+    return exports
+
+
+def _export_all(local_root, exported_root, exports, config):
+    """Export all commits, reusing exports already in the cache directory and pruning old ones.
+
+    :param str local_root: Local path to git root directory.
+    :param str exported_root: Tempdir (or cache directory) path.
+    :param dict exports: Output of _tree_keys().
+    :param sphinxcontrib.versioning.lib.Config config: Runtime configuration.
+    """
+    log = logging.getLogger(__name__)
+    store = os.path.join(exported_root, CACHE_BLOBS_DIR) if config.hardlink_exports else None
+    for tree, (sha, export_paths) in exports.items():
+        target = os.path.join(exported_root, tree)
+        if not config.cache_dir:
+            log.debug('Exporting %s (tree %s) to temporary directory: %s', sha, tree, ' '.join(export_paths) or '.')
+            if store:
+                export_linked(local_root, sha, target, store, export_paths)
+            else:
+                export(local_root, sha, target, export_paths)
+        elif export_cached(local_root, sha, target, export_paths, store):
+            log.debug('Using cached export of %s (tree %s): %s', sha, tree, target)
+        else:
+            log.debug('Exported %s (tree %s) to cache directory: %s', sha, tree, target)
+    if config.cache_dir:
+        prune_cache(exported_root, exports, config.cache_limit)
+
+
+def _read_all_configs(exported_root, versions, config):
+    """Get found_docs and master_doc values for all versions. Versions whose configuration can't be read are removed.
+
+    :raise HandledError: If the root ref's configuration can't be read. Will be logged before raising.
+
+    :param str exported_root: Tempdir (or cache directory) path with exported commits.
+    :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
+    :param sphinxcontrib.versioning.lib.Config config: Runtime configuration.
+
+    :return: Configuration of the root ref returned by read_configs().
+    :rtype: dict
+    """
+    log = logging.getLogger(__name__)
+    sources = dict()
+    for remote in versions.remotes:
+        key = (remote['tree'], remote['conf_rel_path'])
+        if key not in sources:
+            log.debug('Partially running sphinx-build to read configuration for: %s', remote['name'])
+            sources[key] = (os.path.dirname(os.path.join(exported_root, *key)), remote['name'])
+    keys = list(sources)
+    configs = dict(zip(keys, read_configs((sources[k] for k in keys), config.jobs)))
+    root_remote = versions[config.root_ref]
+    root_config = configs[(root_remote['tree'], root_remote['conf_rel_path'])]
+    if root_config is None:
+        log.error('Failed to read configuration of root ref: %s', root_remote['name'])
+        raise HandledError
+    for remote in list(versions.remotes):
+        remote_config = configs[(remote['tree'], remote['conf_rel_path'])]
+        if remote_config is None:
+            log.warning('Skipping. Will not be building: %s', remote['name'])
+            versions.remotes.pop(versions.remotes.index(remote))
+            continue
+        remote['found_docs'] = remote_config['found_docs']
+        remote['master_doc'] = remote_config['master_doc']
+    return root_config
+
+
 def pre_build(local_root, versions):
-    """Build docs for all versions to determine root directory and master_doc names.
+    """Read the Sphinx config of all versions to determine root directory and master_doc names.
 
-    Need to build docs to (a) avoid filename collision with files from root_ref and branch/tag names and (b) determine
+    Need to read configs to (a) avoid filename collision with files from root_ref and branch/tag names and (b) determine
     master_doc config values for all versions (in case master_doc changes from e.g. contents.rst to index.rst between
-    versions).
+    versions). Sphinx stops before parsing any documents, files written by the root_ref build are derived from its
+    found_docs and config.
 
     Exports all commits into a temporary directory and returns the path to avoid re-exporting during the final build.
+    Refs with identical files (same git tree hash, e.g. a release branch and its tag) share one export and one
+    configuration read. When only some paths are exported the key is a hash of all exported paths and their trees.
+    With --hardlink-exports files are hard linked from a blob store shared by all exports.
 
     :param str local_root: Local path to git root directory.
     :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
 
-    :return: Tempdir path with exported commits as subdirectories.
+    :return: Tempdir (or cache directory) path with exported commits as subdirectories named after their tree hash.
     :rtype: str
     """
     log = logging.getLogger(__name__)
-    exported_root = TempDir(True).name
-
-    # Extract all.
-    for sha in {r['sha'] for r in versions.remotes}:
-        target = os.path.join(exported_root, sha)
-        log.debug('Exporting %s to temporary directory.', sha)
-        export(local_root, sha, target)
-
-    # Build root.
-    remote = versions[Config.from_context().root_ref]
-    with TempDir() as temp_dir:
-        log.debug('Building root (before setting root_dirs) in temporary directory: %s', temp_dir)
-        source = os.path.dirname(os.path.join(exported_root, remote['sha'], remote['conf_rel_path']))
-        build(source, temp_dir, versions, remote['name'], True)
-        existing = os.listdir(temp_dir)
-
-    # Define root_dir for all versions to avoid file name collisions.
+    config = Config.from_context()
+    if config.cache_dir:
+        exported_root = os.path.abspath(config.cache_dir)
+        if not os.path.isdir(exported_root):
+            os.makedirs(exported_root)
+    else:
+        exported_root = TempDir(True).name
+
+    # Export all and read their configs.
+    _export_all(local_root, exported_root, _tree_keys(local_root, versions, config), config)
+    root_config = _read_all_configs(exported_root, versions, config)
+
+    # Define root_dir for all versions to avoid file name collisions with files written by the root ref's build.
+    existing = sorted(root_config['output_names']) + [VERSIONS_JSON_FILE]
     for remote in versions.remotes:
         root_dir = RE_INVALID_FILENAME.sub('_', remote['name'])
         while root_dir in existing:
@@ -138,48 +390,229 @@ def pre_build(local_root, versions):
         log.debug('%s root directory is %s', remote['name'], root_dir)
         existing.append(root_dir)
 
-    # Get found_docs and master_doc values for all versions.
-    for remote in list(versions.remotes):
-        log.debug('Partially running sphinx-build to read configuration for: %s', remote['name'])
-        source = os.path.dirname(os.path.join(exported_root, remote['sha'], remote['conf_rel_path']))
-        try:
-            config = read_config(source, remote['name'])
-        except HandledError:
-            log.warning('Skipping. Will not be building: %s', remote['name'])
-            versions.remotes.pop(versions.remotes.index(remote))
-            continue
-        remote['found_docs'] = config['found_docs']
-        remote['master_doc'] = config['master_doc']
-
     return exported_root
 
 
+def validate_all(exported_root, versions):
+    """Parse all versions with Sphinx's dummy builder and drop the ones that fail before any HTML is written.
+
+    Doctrees and the pickled environment are written where build_all() will look for them, so the HTML build doesn't
+    read documents again.
+
+    :raise HandledError: If the root ref fails. Will be logged before raising.
+
+    :param str exported_root: Tempdir path with exported commits as subdirectories named after their tree hash.
+    :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
+
+    :return: Summary with results of every version.
+    :rtype: dict
+    """
+    log = logging.getLogger(__name__)
+    config = Config.from_context()
+    remotes = list(versions.remotes)
+
+    with TempDir() as temp_dir:
+        builds = list()
+        for remote in remotes:
+            source = os.path.dirname(os.path.join(exported_root, remote['tree'], remote['conf_rel_path']))
+            target = os.path.join(temp_dir, remote['root_dir'])
+            builds.append((source, target, remote['name'], doctrees_dir(exported_root, remote)))
+        failed = build_many(builds, versions, config.jobs, 'dummy')
+
+    summary = dict(
+        failed=failed,
+        refs=[dict(id=r['id'], name=r['name'], passed=r['name'] not in failed, sha=r['sha']) for r in remotes],
+        root_ref=config.root_ref,
+        version=__version__,
+    )
+    if config.validate_summary:
+        log.debug('Writing validation summary to: %s', config.validate_summary)
+        with open(config.validate_summary, 'w') as handle:
+            json.dump(summary, handle, indent=1, sort_keys=True)
+
+    if config.root_ref in failed:
+        log.error('Root ref failed validation: %s', config.root_ref)
+        raise HandledError
+    for name in failed:
+        log.warning('Skipping. Will not be building: %s', name)
+        versions.remotes.pop(versions.remotes.index(versions[name]))
+    log.info('Passed validation: %s', ' '.join(r['name'] for r in versions.remotes))
+
+    return summary
+
+
+def versions_hash(versions):
+    """Hash everything about the list of versions and global settings that ends up in every generated HTML page.
+
+    If this changes (e.g. a new tag, a deleted branch, a different banner main ref) the version switcher and banner in
+    every page of every version is out of date.
+
+    :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
+
+    :return: SHA1 hex digest.
+    :rtype: str
+    """
+    config = Config.from_context()
+    if config.versions_json:
+        # Pages only link to the banner main ref, everything else is in VERSIONS_JSON_FILE.
+        remotes = [r for r in versions.remotes if config.show_banner and r['name'] == config.banner_main_ref]
+        data = [[r['id'], r['root_dir'], r['master_doc'], sorted(r['found_docs'])] for r in remotes]
+    else:
+        data = [[r['id'], r['root_dir'], r['master_doc'], sorted(r['found_docs'])] for r in versions.remotes]
+        data.append([(r or dict()).get('id') for r in (versions.greatest_tag_remote, versions.recent_branch_remote,
+                                                       versions.recent_remote, versions.recent_tag_remote)])
+    data.append([config.root_ref, config.show_banner, config.banner_main_ref, list(config.overflow)])
+    data.append(config.versions_json)
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def manifest_entry(remote, digest):
+    """Return what is recorded in the build manifest for one built version.
+
+    :param dict remote: Version dict from Versions.remotes.
+    :param str digest: Output of versions_hash().
+
+    :return: Manifest entry.
+    :rtype: dict
+    """
+    return dict(
+        conf_rel_path=remote['conf_rel_path'],
+        id=remote['id'],
+        root_dir=remote['root_dir'],
+        sha=remote['sha'],
+        version=__version__,
+        versions_hash=digest,
+    )
+
+
+def read_manifest(destination):
+    """Read the build manifest left in the destination directory by a previous run.
+
+    :param str destination: Destination directory of the previous build.
+
+    :return: Manifest with "root" and "refs" keys. Empty dict if not found or unreadable.
+    :rtype: dict
+    """
+    log = logging.getLogger(__name__)
+    path = os.path.join(destination, MANIFEST_FILE)
+    if not os.path.isfile(path):
+        log.debug('No build manifest found in %s.', destination)
+        return dict()
+    try:
+        with open(path) as handle:
+            manifest = json.load(handle)
+    except (IOError, ValueError) as exc:
+        log.warning('Ignoring unreadable build manifest %s: %s', path, str(exc))
+        return dict()
+    if not isinstance(manifest, dict):
+        log.warning('Ignoring invalid build manifest %s.', path)
+        return dict()
+    return manifest
+
+
+def write_manifest(destination, manifest):
+    """Write the build manifest into the destination directory for the next run.
+
+    :param str destination: Destination directory of the build.
+    :param dict manifest: Manifest with "root" and "refs" keys.
+    """
+    with open(os.path.join(destination, MANIFEST_FILE), 'w') as handle:
+        json.dump(manifest, handle, indent=1, sort_keys=True)
+
+
+def write_versions_json(destination, versions):
+    """Write the list of versions loaded by the version switcher in pages built with --versions-json.
+
+    :param str destination: Destination directory of the build (web root).
+    :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
+    """
+    remotes = [dict(
+        found_docs=sorted(r['found_docs']),
+        kind=r['kind'],
+        master_doc=r['master_doc'],
+        name=r['name'],
+        root_dir=r['root_dir'],
+    ) for r in versions.remotes]
+    with open(os.path.join(destination, VERSIONS_JSON_FILE), 'w') as handle:
+        json.dump(dict(remotes=remotes), handle, sort_keys=True)
+
+
+def is_up_to_date(entry, remote, digest, target):
+    """Determine if a version's previously built docs can be kept as they are.
+
+    :param dict entry: Manifest entry from the previous run. May be None.
+    :param dict remote: Version dict from Versions.remotes.
+    :param str digest: Output of versions_hash().
+    :param str target: Directory the version's docs were/will be written to.
+
+    :return: If nothing changed since the previous build and the docs are still there.
+    :rtype: bool
+    """
+    if entry != manifest_entry(remote, digest):
+        return False
+    return os.path.isfile(os.path.join(target, '{}.html'.format(remote['master_doc'])))
+
+
 def build_all(exported_root, destination, versions):
     """Build all versions.
 
-    :param str exported_root: Tempdir path with exported commits as subdirectories.
+    :param str exported_root: Tempdir path with exported commits as subdirectories named after their tree hash.
     :param str destination: Destination directory to copy/overwrite built docs to. Does not delete old files.
     :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
     """
     log = logging.getLogger(__name__)
+    config = Config.from_context()
+    manifest = read_manifest(destination) if config.incremental else dict()
 
+    # Versions built during this run are recorded in the manifest too. When a ref fails to build it's dropped and
+    # only versions whose pages embed the list of versions are built again. Their doctrees and pickled environment are
+    # reused so Sphinx only re-renders HTML.
+    manifest.setdefault('refs', dict())
     while True:
+        digest = versions_hash(versions)
+
         # Build root.
-        remote = versions[Config.from_context().root_ref]
-        log.info('Building root: %s', remote['name'])
-        source = os.path.dirname(os.path.join(exported_root, remote['sha'], remote['conf_rel_path']))
-        build(source, destination, versions, remote['name'], True)
+        remote = versions[config.root_ref]
+        if is_up_to_date(manifest.get('root'), remote, digest, destination):
+            log.info('Root is up to date, skipping: %s', remote['name'])
+        else:
+            log.info('Building root: %s', remote['name'])
+            source = os.path.dirname(os.path.join(exported_root, remote['tree'], remote['conf_rel_path']))
+            build(source, destination, versions, remote['name'], True, doctrees_dir(exported_root, remote, True))
+            manifest['root'] = manifest_entry(remote, digest)
 
         # Build all refs.
-        for remote in list(versions.remotes):
-            log.info('Building ref: %s', remote['name'])
-            source = os.path.dirname(os.path.join(exported_root, remote['sha'], remote['conf_rel_path']))
+        builds = list()
+        for remote in versions.remotes:
+            source = os.path.dirname(os.path.join(exported_root, remote['tree'], remote['conf_rel_path']))
             target = os.path.join(destination, remote['root_dir'])
-            try:
-                build(source, target, versions, remote['name'], False)
-            except HandledError:
-                log.warning('Skipping. Will not be building %s. Rebuilding everything.', remote['name'])
-                versions.remotes.pop(versions.remotes.index(remote))
-                break  # Break out of for loop.
-        else:
-            break  # Break out of while loop if for loop didn't execute break statement above.
+            if is_up_to_date(manifest['refs'].get(remote['id']), remote, digest, target):
+                log.info('Ref is up to date, skipping: %s', remote['name'])
+                continue
+            builds.append((source, target, remote['name'], doctrees_dir(exported_root, remote)))
+        failed = build_many(builds, versions, config.jobs)
+        for name in (b[2] for b in builds if b[2] not in failed):
+            manifest['refs'][versions[name]['id']] = manifest_entry(versions[name], digest)
+        if not failed:
+            break
+
+        # Remove failed refs and update the list of versions in the others.
+        for name in failed:
+            log.warning('Skipping. Will not be building %s. Updating other versions.', name)
+            manifest['refs'].pop(versions[name]['id'], None)
+            versions.remotes.pop(versions.remotes.index(versions[name]))
+
+    # Write list of versions for the version switcher.
+    if config.versions_json:
+        write_versions_json(destination, versions)
+
+    # Evict doctrees of old refs.
+    if config.cache_dir:
+        prune_doctrees(exported_root, versions, config.root_ref, config.cache_limit)
+
+    # Record what was built for the next run.
+    if config.incremental:
+        write_manifest(destination, dict(
+            root=manifest_entry(versions[config.root_ref], digest),
+            refs={r['id']: manifest_entry(r, digest) for r in versions.remotes},
+        ))
@@ -1,6 +1,8 @@
 """Interface with Sphinx."""
 
 import datetime
+import hashlib
+import json
 import logging
 import multiprocessing
 import os
@@ -9,7 +11,7 @@ import sys
 from sphinx import application, build_main, locale
 from sphinx.builders.html import StandaloneHTMLBuilder
 from sphinx.config import Config as SphinxConfig
-from sphinx.errors import SphinxError
+from sphinx.errors import ExtensionError, SphinxError
 from sphinx.jinja2glue import SphinxFileSystemLoader
 from sphinx.util.i18n import format_date
 
@@ -17,8 +19,8 @@ from sphinxcontrib.versioning import __version__
 from sphinxcontrib.versioning.lib import Config, HandledError, TempDir
 from sphinxcontrib.versioning.versions import Versions
 
-SC_VERSIONING_VERSIONS = list()  # Updated after forking.
 STATIC_DIR = os.path.join(os.path.dirname(__file__), '_static')
+VERSIONS_JSON_FILE = 'versions.json'
 
 
 class EventHandlers(object):
@@ -32,6 +34,8 @@ class EventHandlers(object):
     :ivar bool IS_ROOT: Value for context['scv_is_root'].
     :ivar bool SHOW_BANNER: Display the banner.
     :ivar sphinxcontrib.versioning.versions.Versions VERSIONS: Versions class instance.
+    :ivar str VERSIONS_DIGEST: Hash of everything above that ends up in HTML pages.
+    :ivar bool VERSIONS_JSON: Pages load the list of versions from VERSIONS_JSON_FILE in the web root instead.
     """
 
     ABORT_AFTER_READ = None
@@ -42,6 +46,8 @@ class EventHandlers(object):
     IS_ROOT = False
     SHOW_BANNER = False
     VERSIONS = None
+    VERSIONS_DIGEST = ''
+    VERSIONS_JSON = False
 
     @staticmethod
     def builder_inited(app):
@@ -49,6 +55,9 @@ class EventHandlers(object):
 
         :param sphinx.application.Sphinx app: Sphinx application object.
         """
+        if not hasattr(app.builder, 'templates'):
+            return  # Not an HTML builder (e.g. dummy).
+
         # Add this extension's _templates directory to Sphinx.
         templates_dir = os.path.join(os.path.dirname(__file__), '_templates')
         app.builder.templates.pathchain.insert(0, templates_dir)
@@ -64,17 +73,31 @@ class EventHandlers(object):
         elif 'versions.html' not in app.config.html_sidebars['**']:
             app.config.html_sidebars['**'].append('versions.html')
 
+    @classmethod
+    def env_before_read_docs(cls, app, env, docnames):
+        """Abort Sphinx after initializing config and discovering all pages to build, before parsing any of them.
+
+        :param sphinx.application.Sphinx app: Sphinx application object.
+        :param sphinx.environment.BuildEnvironment env: Sphinx build environment.
+        :param list docnames: Documents about to be read.
+        """
+        assert docnames is not None  # Unused, for linting.
+        cls.env_updated(app, env)
+
     @classmethod
     def env_updated(cls, app, env):
         """Abort Sphinx after initializing config and discovering all pages to build.
 
+        Fallback for Sphinx versions without the env-before-read-docs event.
+
         :param sphinx.application.Sphinx app: Sphinx application object.
         :param sphinx.environment.BuildEnvironment env: Sphinx build environment.
         """
         if cls.ABORT_AFTER_READ:
             config = {n: getattr(app.config, n) for n in (a for a in dir(app.config) if a.startswith('scv_'))}
-            config['found_docs'] = tuple(str(d) for d in env.found_docs)
+            config['found_docs'] = frozenset(str(d) for d in env.found_docs)
             config['master_doc'] = str(app.config.master_doc)
+            config['output_names'] = output_names(app, env)
             cls.ABORT_AFTER_READ.put(config)
             sys.exit(0)
 
@@ -112,6 +135,10 @@ class EventHandlers(object):
         context['scv_is_root'] = cls.IS_ROOT
         context['scv_is_tag'] = this_remote['kind'] == 'tags'
         context['scv_show_banner'] = cls.SHOW_BANNER
+        context['scv_versions_json'] = None
+        if cls.VERSIONS_JSON:
+            components = ['..'] * pagename.count('/') + ([] if cls.IS_ROOT else ['..'])
+            context['scv_versions_json'] = '/'.join(components + [VERSIONS_JSON_FILE])
         context['versions'] = versions
         context['vhasdoc'] = versions.vhasdoc
         context['vpathto'] = versions.vpathto
@@ -137,6 +164,38 @@ class EventHandlers(object):
                 context['last_updated'] = format_date(lufmt, mtime, language=app.config.language)
 
 
+def output_names(app, env):
+    """Return names of files and directories the builder will write to the top level of its output directory.
+
+    Used to avoid collisions with root_dir names without building the root ref. Errs on the side of listing too much
+    (e.g. domain indices which may turn out empty).
+
+    :param sphinx.application.Sphinx app: Sphinx application object.
+    :param sphinx.environment.BuildEnvironment env: Sphinx build environment.
+
+    :return: File and directory names.
+    :rtype: frozenset
+    """
+    builder = app.builder
+    names = {'.buildinfo', '.doctrees', '_downloads', '_images', '_modules', '_sources', '_static', 'objects.inv'}
+    names.add(getattr(builder, 'searchindex_filename', 'searchindex.js'))
+
+    # Pages.
+    pages = set(env.found_docs) | {'genindex', 'genindex-all', 'search'}
+    pages.update(getattr(app.config, 'html_additional_pages', dict()))
+    pages.update('{0}-{1}'.format(d.name, i.name) for d in env.domains.values() for i in d.indices)
+    if hasattr(builder, 'get_outfilename'):
+        for page in pages:
+            names.add(os.path.relpath(builder.get_outfilename(page), builder.outdir).split(os.sep)[0])
+
+    # Files copied as they are.
+    for extra_path in getattr(app.config, 'html_extra_path', list()):
+        extra_path = os.path.join(app.confdir, extra_path)
+        names.update(os.listdir(extra_path) if os.path.isdir(extra_path) else [os.path.basename(extra_path)])
+
+    return frozenset(str(n) for n in names)
+
+
 def setup(app):
     """Called by Sphinx during phase 0 (initialization).
 
@@ -145,8 +204,8 @@ def setup(app):
     :returns: Extension version.
     :rtype: dict
     """
-    # Used internally. For rebuilding all pages when one or versions fail.
-    app.add_config_value('sphinxcontrib_versioning_versions', SC_VERSIONING_VERSIONS, 'html')
+    # Used internally. Rewrite all HTML pages when versions or the banner change. Doesn't invalidate the environment.
+    app.add_config_value('sphinxcontrib_versioning_versions', EventHandlers.VERSIONS_DIGEST, 'html')
 
     # Needed for banner.
     app.config.html_static_path.append(STATIC_DIR)
@@ -158,6 +217,10 @@ def setup(app):
 
     # Event handlers.
     app.connect('builder-inited', EventHandlers.builder_inited)
+    try:
+        app.connect('env-before-read-docs', EventHandlers.env_before_read_docs)
+    except ExtensionError:
+        pass  # Sphinx < 1.3.
     app.connect('env-updated', EventHandlers.env_updated)
     app.connect('html-page-context', EventHandlers.html_page_context)
     return dict(version=__version__)
@@ -172,7 +235,32 @@ class ConfigInject(SphinxConfig):
         self.extensions.append('sphinxcontrib.versioning.sphinx_')
 
 
-def _build(argv, config, versions, current_name, is_root):
+def versions_digest(versions, current_name, is_root):
+    """Hash the version switcher and banner data rendered into every HTML page of one build.
+
+    :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
+    :param str current_name: The ref name of the current version being built.
+    :param bool is_root: Is this build in the web root?
+
+    :return: SHA1 hex digest.
+    :rtype: str
+    """
+    remotes = versions.remotes
+    if EventHandlers.VERSIONS_JSON:  # Only the banner links to another version.
+        remotes = [r for r in remotes if EventHandlers.SHOW_BANNER and r['name'] == EventHandlers.BANNER_MAIN_VERSION]
+    banner = ('BANNER_GREATEST_TAG', 'BANNER_MAIN_VERSION', 'BANNER_RECENT_TAG', 'SHOW_BANNER')
+    state = dict(
+        banner=[getattr(EventHandlers, a) for a in banner],
+        current_name=current_name,
+        is_root=is_root,
+        remotes=[{k: sorted(v) if k == 'found_docs' else v for k, v in r.items() if k not in ('date', 'sha', 'tree')}
+                 for r in remotes],
+        versions_json=EventHandlers.VERSIONS_JSON,
+    )
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _build(argv, config, versions, current_name, is_root, log_file=None):
     """Build Sphinx docs via multiprocessing for isolation.
 
     :param tuple argv: Arguments to pass to Sphinx.
@@ -180,7 +268,12 @@ def _build(argv, config, versions, current_name, is_root):
     :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
     :param str current_name: The ref name of the current version being built.
     :param bool is_root: Is this build in the web root?
+    :param str log_file: Redirect sphinx-build's stdout and stderr to this file (for parallel builds).
     """
+    # Redirect output.
+    if log_file:
+        sys.stdout = sys.stderr = open(log_file, 'w')
+
     # Patch.
     application.Config = ConfigInject
     if config.show_banner:
@@ -191,7 +284,8 @@ def _build(argv, config, versions, current_name, is_root):
     EventHandlers.CURRENT_VERSION = current_name
     EventHandlers.IS_ROOT = is_root
     EventHandlers.VERSIONS = versions
-    SC_VERSIONING_VERSIONS[:] = [p for r in versions.remotes for p in sorted(r.items()) if p[0] not in ('sha', 'date')]
+    EventHandlers.VERSIONS_JSON = config.versions_json
+    EventHandlers.VERSIONS_DIGEST = versions_digest(versions, current_name, is_root)
 
     # Update argv.
     if config.verbose > 1:
@@ -207,22 +301,42 @@ def _build(argv, config, versions, current_name, is_root):
         raise SphinxError
 
 
-def _read_config(argv, config, current_name, queue):
+def _read_config(argv, config, current_name, queue, log_file=None):
     """Read the Sphinx config via multiprocessing for isolation.
 
     :param tuple argv: Arguments to pass to Sphinx.
     :param sphinxcontrib.versioning.lib.Config config: Runtime configuration.
     :param str current_name: The ref name of the current version being built.
     :param multiprocessing.queues.Queue queue: Communication channel to parent process.
+    :param str log_file: Redirect sphinx-build's stdout and stderr to this file (for parallel reads).
     """
     # Patch.
     EventHandlers.ABORT_AFTER_READ = queue
 
     # Run.
-    _build(argv, config, Versions(list()), current_name, False)
+    _build(argv, config, Versions(list()), current_name, False, log_file)
+
+
+def sphinx_argv(source, target, doctrees=None, builder=None):
+    """Return sphinx-build command line arguments.
+
+    :param str source: Source directory to pass to sphinx-build.
+    :param str target: Destination directory to write documentation to (passed to sphinx-build).
+    :param str doctrees: Directory for doctrees and the pickled environment. Default is in target.
+    :param str builder: Sphinx builder name. Default is html.
+
+    :return: Arguments for build_main().
+    :rtype: tuple
+    """
+    argv = ('sphinx-build',)
+    if builder:
+        argv += ('-b', builder)
+    if doctrees:
+        argv += ('-d', doctrees)
+    return argv + (source, target)
 
 
-def build(source, target, versions, current_name, is_root):
+def build(source, target, versions, current_name, is_root, doctrees=None):
     """Build Sphinx docs for one version. Includes Versions class instance with names/urls in the HTML context.
 
     :raise HandledError: If sphinx-build fails. Will be logged before raising.
@@ -232,9 +346,10 @@ def build(source, target, versions, current_name, is_root):
     :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
     :param str current_name: The ref name of the current version being built.
     :param bool is_root: Is this build in the web root?
+    :param str doctrees: Directory for doctrees and the pickled environment, reused by later builds of the same source.
     """
     log = logging.getLogger(__name__)
-    argv = ('sphinx-build', source, target)
+    argv = sphinx_argv(source, target, doctrees)
     config = Config.from_context()
 
     log.debug('Running sphinx-build for %s with args: %s', current_name, str(argv))
@@ -257,19 +372,141 @@ def read_config(source, current_name):
     :return: Specific Sphinx config values.
     :rtype: dict
     """
+    config = read_configs([(source, current_name)], 1)[0]
+    if config is None:
+        raise HandledError
+    return config
+
+
+def _flush_log(log_file):
+    """Print output buffered by a child process to stdout.
+
+    :param str log_file: File path or None if output wasn't buffered.
+    """
+    if log_file and os.path.isfile(log_file):
+        with open(log_file) as handle:
+            sys.stdout.write(handle.read())
+        sys.stdout.flush()
+
+
+def read_configs(sources, jobs):
+    """Read the Sphinx config for many versions, running up to `jobs` sphinx-build child processes at the same time.
+
+    Sphinx stops after discovering all documents, before parsing any of them.
+
+    :raise ValueError: If `jobs` is less than 1.
+
+    :param iter sources: List of tuples (source, current_name) for each version.
+    :param int jobs: Maximum number of concurrent sphinx-build processes.
+
+    :return: Specific Sphinx config values for each version, same order as `sources`. None for failed versions.
+    :rtype: list
+    """
+    if jobs < 1:
+        raise ValueError('jobs must be at least 1, got {}'.format(jobs))
     log = logging.getLogger(__name__)
-    queue = multiprocessing.Queue()
     config = Config.from_context()
+    sources = list(sources)
+    results = [None] * len(sources)
+    pending = list(range(len(sources)))
+    running = dict()
 
     with TempDir() as temp_dir:
-        argv = ('sphinx-build', source, temp_dir)
-        log.debug('Running sphinx-build for config values with args: %s', str(argv))
-        child = multiprocessing.Process(target=_read_config, args=(argv, config, current_name, queue))
-        child.start()
-        child.join()  # Block.
-        if child.exitcode != 0:
-            log.error('sphinx-build failed for branch/tag while reading config: %s', current_name)
-            raise HandledError
-
-    config = queue.get()
-    return config
+        while pending or running:
+            # Start new reads while there are free slots.
+            while pending and len(running) < jobs:
+                i = pending.pop(0)
+                source, current_name = sources[i]
+                argv = ('sphinx-build', source, os.path.join(temp_dir, str(i)))
+                log_file = os.path.join(temp_dir, '{}.log'.format(i)) if jobs > 1 else None
+                log.debug('Running sphinx-build for config values with args: %s', str(argv))
+                queue = multiprocessing.Queue()
+                child = multiprocessing.Process(target=_read_config, args=(argv, config, current_name, queue, log_file))
+                child.start()
+                running[i] = (child, queue, log_file)
+
+            # Collect results. Get from the queue before joining, children block on exit until it's read.
+            for i, (child, queue, log_file) in sorted(running.items()):
+                if queue.empty():
+                    if child.is_alive():
+                        child.join(0.01)
+                        continue
+                    if queue.empty():  # Exited without sending anything.
+                        log.error('sphinx-build failed for branch/tag while reading config: %s', sources[i][1])
+                else:
+                    results[i] = queue.get()
+                child.join()
+                del running[i]
+                _flush_log(log_file)
+
+    return results
+
+
+def _start_build(build_args, versions, builder, log_file):
+    """Start a sphinx-build child process for one version.
+
+    :param tuple build_args: Tuple (source, target, current_name, doctrees), one item of `builds` in build_many().
+    :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
+    :param str builder: Sphinx builder name. Default is html.
+    :param str log_file: Buffer output in this file or None to print directly.
+
+    :return: Started child process.
+    :rtype: multiprocessing.Process
+    """
+    log = logging.getLogger(__name__)
+    source, target, current_name, doctrees = build_args
+    argv = sphinx_argv(source, target, doctrees, builder)
+    log.info('Building ref: %s', current_name)
+    log.debug('Running sphinx-build for %s with args: %s', current_name, str(argv))
+    child = multiprocessing.Process(
+        target=_build, args=(argv, Config.from_context(), versions, current_name, False, log_file)
+    )
+    child.start()
+    return child
+
+
+def build_many(builds, versions, jobs, builder=None):
+    """Build Sphinx docs for many versions, running up to `jobs` sphinx-build child processes at the same time.
+
+    Output from each child process is buffered and printed in the same order as `builds` so it doesn't interleave.
+
+    :raise ValueError: If `jobs` is less than 1.
+
+    :param iter builds: List of tuples (source, target, current_name, doctrees) for each version to build.
+    :param sphinxcontrib.versioning.versions.Versions versions: Versions class instance.
+    :param int jobs: Maximum number of concurrent sphinx-build processes.
+    :param str builder: Sphinx builder name. Default is html.
+
+    :return: Names of versions that failed to build, in the same order as `builds`.
+    :rtype: list
+    """
+    if jobs < 1:
+        raise ValueError('jobs must be at least 1, got {}'.format(jobs))
+    log = logging.getLogger(__name__)
+    builds = list(builds)
+    children = [None] * len(builds)
+    failed = list()
+    reported = 0
+
+    with TempDir() as temp_dir:
+        log_files = [os.path.join(temp_dir, '{}.log'.format(n)) if jobs > 1 else None for n in range(len(builds))]
+        while reported < len(builds):
+            # Start new builds while there are free slots.
+            running = [c for c in children if c and c.exitcode is None]
+            for i in [n for n, c in enumerate(children) if c is None][:max(jobs - len(running), 0)]:
+                children[i] = _start_build(builds[i], versions, builder, log_files[i])
+                running.append(children[i])
+
+            # Wait for the oldest running build (or any other) to finish. All may have exited since polling above.
+            if running:
+                running[0].join(0.1)
+
+            # Report finished builds in order.
+            while reported < len(builds) and children[reported] and children[reported].exitcode is not None:
+                _flush_log(log_files[reported])
+                if children[reported].exitcode != 0:
+                    log.error('sphinx-build failed for branch/tag: %s', builds[reported][2])
+                    failed.append(builds[reported][2])
+                reported += 1
+
+    return failed
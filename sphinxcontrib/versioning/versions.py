@@ -1,5 +1,7 @@
 """Collect and sort version strings."""
 
+import bisect
+import itertools
 import re
 
 RE_SEMVER = re.compile(r'^v?V?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:\.(\d+))?(?:\.(\d+))?(?:\.(\d+))?(?:\.(\d+))?([\w.+-]*)$')
@@ -87,10 +89,114 @@ def multi_sort(remotes, sort):
     remotes.sort(key=lambda k: sort_mapping.get(id(k)))
 
 
+def _invalidates_indexes(name):
+    """Return a list method that invalidates Remotes indexes after calling the original.
+
+    :param str name: Name of the list method.
+
+    :return: Method.
+    :rtype: function
+    """
+    original = getattr(list, name)
+
+    def method(self, *args, **kwargs):
+        """Call list method and invalidate indexes."""
+        result = original(self, *args, **kwargs)
+        self.invalidate()
+        return result
+    method.__name__ = name
+    method.__doc__ = original.__doc__
+    return method
+
+
+class Remotes(list):
+    """List of version dicts that keeps lookup indexes for Versions.__getitem__().
+
+    Indexes are rebuilt lazily on the first lookup after the list is changed (e.g. remotes popped during pre_build).
+    Values of indexed keys in the dicts themselves must not be changed.
+
+    :cvar tuple KEYS: Indexed dict keys, in the order Versions.__getitem__() looks them up.
+
+    :ivar int changes: Number of times the list was changed. For invalidating other caches.
+    """
+
+    KEYS = ('id', 'sha', 'name', 'date')
+
+    __delitem__ = _invalidates_indexes('__delitem__')
+    __iadd__ = _invalidates_indexes('__iadd__')
+    __imul__ = _invalidates_indexes('__imul__')
+    __setitem__ = _invalidates_indexes('__setitem__')
+    append = _invalidates_indexes('append')
+    extend = _invalidates_indexes('extend')
+    insert = _invalidates_indexes('insert')
+    pop = _invalidates_indexes('pop')
+    remove = _invalidates_indexes('remove')
+    reverse = _invalidates_indexes('reverse')
+    sort = _invalidates_indexes('sort')
+    if hasattr(list, 'clear'):  # Python 3.x.
+        clear = _invalidates_indexes('clear')
+    if hasattr(list, '__setslice__'):  # Python 2.x.
+        __delslice__ = _invalidates_indexes('__delslice__')
+        __setslice__ = _invalidates_indexes('__setslice__')
+
+    def __init__(self, *args):
+        """Constructor."""
+        super(Remotes, self).__init__(*args)
+        self._indexes = None
+        self._sorted_shas = None
+        self.changes = 0
+
+    def invalidate(self):
+        """Invalidate indexes. Called after every change to the list."""
+        self._indexes = None
+        self._sorted_shas = None
+        self.changes += 1
+
+    def lookup(self, key, value):
+        """Return the first remote whose `key` equals `value`.
+
+        :raise KeyError: If not found.
+
+        :param str key: One of KEYS.
+        :param value: Value to look up.
+
+        :return: Remote.
+        :rtype: dict
+        """
+        if self._indexes is None:
+            self._indexes = {k: dict() for k in self.KEYS}
+            for remote in self:
+                for k, index in self._indexes.items():
+                    index.setdefault(remote[k], remote)
+        return self._indexes[key][value]
+
+    def sha_prefix(self, prefix):
+        """Return the first remote (in list order) whose SHA starts with `prefix`.
+
+        :raise KeyError: If not found.
+
+        :param str prefix: Abbreviated SHA.
+
+        :return: Remote.
+        :rtype: dict
+        """
+        if self._sorted_shas is None:
+            self._sorted_shas = sorted((r['sha'], i) for i, r in enumerate(self))
+        position = bisect.bisect_left(self._sorted_shas, (prefix, -1))
+        matches = list()
+        for sha, i in itertools.islice(self._sorted_shas, position, None):
+            if not sha.startswith(prefix):
+                break
+            matches.append(i)
+        if not matches:
+            raise KeyError(prefix)
+        return self[min(matches)]
+
+
 class Versions(object):
     """Iterable class that holds all versions and handles sorting and filtering. To be fed into Sphinx's Jinja2 env.
 
-    :ivar iter remotes: List of dicts for every branch/tag.
+    :ivar Remotes remotes: List of dicts for every branch/tag.
     :ivar dict context: Current Jinja2 context, provided by Sphinx's html-page-context API hook.
     :ivar dict greatest_tag_remote: Tag with the highest version number if it's a valid semver.
     :ivar dict recent_branch_remote: Most recently committed branch.
@@ -106,18 +212,21 @@ class Versions(object):
         :param str priority: May be "branches" or "tags". Groups either before the other. Maintains order otherwise.
         :param bool invert: Invert sorted/grouped remotes at the end of processing.
         """
-        self.remotes = [dict(
+        self._remotes = None
+        self.remotes = Remotes(dict(
             id='/'.join(r[2:0:-1]),  # str; kind/name
             sha=r[0],  # str
+            tree=r[0],  # str; git tree hash of exported files, identical for refs with identical files
             name=r[1],  # str
             kind=r[2],  # str
             date=r[3],  # int
             conf_rel_path=r[4],  # str
-            found_docs=tuple(),  # tuple of str
+            found_docs=frozenset(),  # frozenset of str
             master_doc='contents',  # str
             root_dir=r[1],  # str
-        ) for r in remotes]
+        ) for r in remotes)
         self.context = dict()
+        self._page_links = (None, list())
         self.greatest_tag_remote = None
         self.recent_branch_remote = None
         self.recent_remote = None
@@ -150,6 +259,19 @@ class Versions(object):
                 if RE_SEMVER.search(greatest_tag_remote['name']):
                     self.greatest_tag_remote = greatest_tag_remote
 
+    @property
+    def remotes(self):
+        """List of dicts for every branch/tag, indexed for __getitem__()."""
+        return self._remotes
+
+    @remotes.setter
+    def remotes(self, value):
+        """Replace list of dicts, wrapping it in a Remotes instance.
+
+        :param iter value: New list of dicts.
+        """
+        self._remotes = value if isinstance(value, Remotes) else Remotes(value)
+
     def __bool__(self):
         """True if self.remotes is not empty. Python 3.x."""
         return bool(self.remotes)
@@ -165,16 +287,21 @@ class Versions(object):
     def __getitem__(self, item):
         """Retrieve a version dict from self.remotes by any of its attributes."""
         # First assume item is an attribute.
-        for key in ('id', 'sha', 'name', 'date'):
-            for remote in self.remotes:
-                if remote[key] == item:
-                    return remote
-        # Next assume item is a substring of a sha.
+        for key in Remotes.KEYS:
+            try:
+                return self.remotes.lookup(key, item)
+            except (KeyError, TypeError):  # TypeError if unhashable.
+                pass
+        # Next assume item is an abbreviated sha (or any substring of one).
         try:
             length = len(item)
         except TypeError:  # Not an int.
             length = 0
         if length >= 5:
+            try:
+                return self.remotes.sha_prefix(item)
+            except (KeyError, TypeError):
+                pass
             for remote in self.remotes:
                 if item in remote['sha']:
                     return remote
@@ -188,19 +315,35 @@ class Versions(object):
 
     def __iter__(self):
         """Yield name and urls of branches and tags."""
-        for remote in self.remotes:
-            name = remote['name']
-            yield name, self.vpathto(name)
+        for name, url, _ in self.page_links:
+            yield name, url
 
     @property
     def branches(self):
         """Return list of (name and urls) only branches."""
-        return [(r['name'], self.vpathto(r['name'])) for r in self.remotes if r['kind'] == 'heads']
+        return [(n, u) for n, u, k in self.page_links if k == 'heads']
 
     @property
     def tags(self):
         """Return list of (name and urls) only tags."""
-        return [(r['name'], self.vpathto(r['name'])) for r in self.remotes if r['kind'] == 'tags']
+        return [(n, u) for n, u, k in self.page_links if k == 'tags']
+
+    @property
+    def page_links(self):
+        """Return list of (name, url, kind) of all versions for the current page in self.context.
+
+        Computed once per page and reused by __iter__(), branches, and tags (templates may use all of them). Recomputed
+        when the page or self.remotes changes, but not when values in remote dicts change (e.g. root_dir).
+
+        :return: List of tuples.
+        :rtype: list
+        """
+        context = self.context
+        key = (self.remotes.changes, context.get('pagename'), context.get('current_version'),
+               context.get('scv_is_root'))
+        if self._page_links[0] != key:
+            self._page_links = (key, [(r['name'], self.vpathto(r['name']), r['kind']) for r in self.remotes])
+        return self._page_links[1]
 
     def vhasdoc(self, other_version):
         """Return True if the other version has the current document. Like Sphinx's hasdoc().
@@ -234,8 +377,7 @@ class Versions(object):
             return '{}.html'.format(pagename.split('/')[-1])
 
         other_remote = self[other_version]
-        other_root_dir = other_remote['root_dir']
-        components = ['..'] * pagename.count('/')
-        components += [other_root_dir] if is_root else ['..', other_root_dir]
-        components += [pagename if self.vhasdoc(other_version) else other_remote['master_doc']]
-        return '{}.html'.format(__import__('posixpath').join(*components))
+        prefix = '../' * (pagename.count('/') + (0 if is_root else 1))
+        has_doc = self.context['current_version'] == other_version or pagename in other_remote['found_docs']
+        doc = pagename if has_doc else other_remote['master_doc']
+        return '{}{}/{}.html'.format(prefix, other_remote['root_dir'], doc)
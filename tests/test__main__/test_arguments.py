@@ -226,10 +226,11 @@ def test_sub_command_options(local_empty, push, source_cli, source_conf):
 
     # Setup source(s).
     if source_cli:
-        args += ['-itT', '-p', 'branches', '-r', 'feature', '-s', 'semver', '-w', 'master', '-W', '[0-9]']
-        args += ['-aAb', '-B', 'x']
+        args += ['-iItTJV', '-j', '4', '-p', 'branches', '-r', 'feature', '-s', 'semver', '-w', 'master', '-W', '[0-9]']
+        args += ['-aAb', '-B', 'x', '-k', 'cache', '-K', '3', '-x', '-X', 'README', '-X', 'setup.py', '-S', 'v.json']
+        args += ['-f', '2', '-H', '-m', '30', '-R']
         if push:
-            args += ['-e' 'README.md', '-P', 'rem']
+            args += ['-C', 'clone', '-e' 'README.md', '-P', 'rem']
     if source_conf:
         local_empty.ensure('docs', 'contents.rst')
         local_empty.ensure('docs', 'conf.py').write(
@@ -237,14 +238,28 @@ def test_sub_command_options(local_empty, push, source_cli, source_conf):
             'scv_banner_greatest_tag = True\n'
             'scv_banner_main_ref = "y"\n'
             'scv_banner_recent_tag = True\n'
+            'scv_cache_dir = "/tmp/cache"\n'
+            'scv_cache_limit = 5\n'
+            'scv_clone_dir = "/tmp/clone"\n'
+            'scv_export_docs_only = True\n'
+            'scv_export_include = ("src",)\n'
+            'scv_fetch_depth = 3\n'
             'scv_greatest_tag = True\n'
+            'scv_hardlink_exports = True\n'
+            'scv_incremental = True\n'
             'scv_invert = True\n'
+            'scv_jobs = 2\n'
+            'scv_local_refs = True\n'
+            'scv_ls_remote_ttl = 60\n'
             'scv_priority = "tags"\n'
             'scv_push_remote = "origin2"\n'
             'scv_recent_tag = True\n'
             'scv_root_ref = "other"\n'
             'scv_show_banner = True\n'
             'scv_sort = ("alpha",)\n'
+            'scv_validate = True\n'
+            'scv_validate_summary = "summary.json"\n'
+            'scv_versions_json = True\n'
             'scv_whitelist_branches = ("other",)\n'
             'scv_whitelist_tags = re.compile("^[0-9]$")\n'
             'scv_grm_exclude = ("README.rst",)\n'
@@ -259,48 +274,90 @@ def test_sub_command_options(local_empty, push, source_cli, source_conf):
         assert config.banner_greatest_tag is True
         assert config.banner_main_ref == 'x'
         assert config.banner_recent_tag is True
+        assert config.cache_dir == 'cache'
+        assert config.cache_limit == 3
+        assert config.export_docs_only is True
+        assert config.export_include == ('README', 'setup.py')
+        assert config.fetch_depth == 2
         assert config.greatest_tag is True
+        assert config.hardlink_exports is True
+        assert config.incremental is True
         assert config.invert is True
+        assert config.jobs == 4
+        assert config.local_refs is True
+        assert config.ls_remote_ttl == 30
         assert config.priority == 'branches'
         assert config.recent_tag is True
         assert config.root_ref == 'feature'
         assert config.show_banner is True
         assert config.sort == ('semver',)
+        assert config.validate is True
+        assert config.validate_summary == 'v.json'
+        assert config.versions_json is True
         assert config.whitelist_branches == ('master',)
         assert config.whitelist_tags == ('[0-9]',)
         if push:
+            assert config.clone_dir == 'clone'
             assert config.grm_exclude == ('README.md',)
             assert config.push_remote == 'rem'
     elif source_conf:
         assert config.banner_greatest_tag is True
         assert config.banner_main_ref == 'y'
         assert config.banner_recent_tag is True
+        assert config.cache_dir == '/tmp/cache'
+        assert config.cache_limit == 5
+        assert config.export_docs_only is True
+        assert config.export_include == ('src',)
+        assert config.fetch_depth == 3
         assert config.greatest_tag is True
+        assert config.hardlink_exports is True
+        assert config.incremental is True
         assert config.invert is True
+        assert config.jobs == 2
+        assert config.local_refs is True
+        assert config.ls_remote_ttl == 60
         assert config.priority == 'tags'
         assert config.recent_tag is True
         assert config.root_ref == 'other'
         assert config.show_banner is True
         assert config.sort == ('alpha',)
+        assert config.validate is True
+        assert config.validate_summary == 'summary.json'
+        assert config.versions_json is True
         assert config.whitelist_branches == ('other',)
         assert config.whitelist_tags.pattern == '^[0-9]$'
         if push:
+            assert config.clone_dir == '/tmp/clone'
             assert config.grm_exclude == ('README.rst',)
             assert config.push_remote == 'origin2'
     else:
         assert config.banner_greatest_tag is False
         assert config.banner_main_ref == 'master'
         assert config.banner_recent_tag is False
+        assert config.cache_dir is None
+        assert config.cache_limit == 50
+        assert config.export_docs_only is False
+        assert config.export_include == tuple()
+        assert config.fetch_depth == 0
         assert config.greatest_tag is False
+        assert config.hardlink_exports is False
+        assert config.incremental is False
         assert config.invert is False
+        assert config.jobs == 1
+        assert config.local_refs is False
+        assert config.ls_remote_ttl == 0
         assert config.priority is None
         assert config.recent_tag is False
         assert config.root_ref == 'master'
         assert config.show_banner is False
         assert config.sort == tuple()
+        assert config.validate is False
+        assert config.validate_summary is None
+        assert config.versions_json is False
         assert config.whitelist_branches == tuple()
         assert config.whitelist_tags == tuple()
         if push:
+            assert config.clone_dir is None
             assert config.grm_exclude == tuple()
             assert config.push_remote == 'origin'
 
@@ -326,3 +383,22 @@ def test_sub_command_options_other(push):
     assert config.sort == ('semver', 'time')
     if push:
         assert config.grm_exclude == ('one', 'two', 'three', 'four')
+
+
+@pytest.mark.parametrize('push', [False, True])
+def test_sub_command_options_invalid_conf(local_empty, push):
+    """Test rejecting invalid integer settings in conf.py like their command line options.
+
+    :param local_empty: conftest fixture.
+    :param bool push: Run push sub command instead of build.
+    """
+    if push:
+        args = ['push', 'docs', 'gh-pages', '.']
+    else:
+        args = ['build', 'docs', join('docs', '_build', 'html')]
+    local_empty.ensure('docs', 'contents.rst')
+    local_empty.ensure('docs', 'conf.py').write('scv_jobs = 0\n')
+
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 2
+    assert 'Invalid value for scv_jobs: 0 is smaller than the minimum valid value 1.' in result.output
@@ -38,6 +38,40 @@ def test_no_exclude(local_docs_ghp, urls):
     assert sha == old_sha
 
 
+def test_clone_dir(tmpdir, local_docs_ghp, urls):
+    """Test keeping the clone of DEST_BRANCH between runs.
+
+    :param tmpdir: pytest fixture.
+    :param local_docs_ghp: conftest fixture.
+    :param urls: conftest fixture.
+    """
+    clone_dir = tmpdir.join('clone')
+    command = ['sphinx-versioning', 'push', '-C', str(clone_dir), '.', 'gh-pages', '.', '-e', 'README']
+
+    # Run.
+    output = pytest.run(local_docs_ghp, command)
+    assert 'Traceback' not in output
+    assert 'Updating clone of gh-pages in {}...'.format(clone_dir) in output
+    assert clone_dir.join('.git').check(dir=True)
+
+    # Change and commit.
+    local_docs_ghp.join('contents.rst').write('\nNew Unexpected Line!\n', mode='a')
+    pytest.run(local_docs_ghp, ['git', 'commit', '-am', 'Changing docs.'])
+    pytest.run(local_docs_ghp, ['git', 'push', 'origin', 'master'])
+
+    # Run again, reusing the clone.
+    output = pytest.run(local_docs_ghp, command[:1] + ['-v'] + command[1:])
+    assert 'Traceback' not in output
+    assert '"command": ["git", "clone"' not in output
+    assert '"command": ["git", "fetch", "--depth=1"' in output
+
+    # Check HTML.
+    pytest.run(local_docs_ghp, ['git', 'checkout', 'gh-pages'])
+    pytest.run(local_docs_ghp, ['git', 'pull', 'origin', 'gh-pages'])
+    urls(local_docs_ghp.join('contents.html'), ['<li><a href="master/contents.html">master</a></li>'])
+    assert 'New Unexpected Line!' in local_docs_ghp.join('contents.html').read()
+
+
 def test_exclude(local_docs_ghp, urls):
     """Test excluding files and REL_DEST. Also test changing files.
 
@@ -298,7 +332,8 @@ def test_error_build_failure(local_docs_ghp):
     assert exc.value.output.count('Traceback') == 1
     assert "name 'undefined' is not defined" in exc.value.output
     assert 'Building docs...' in exc.value.output
-    assert 'sphinx-build failed for branch/tag: master' in exc.value.output
+    assert 'sphinx-build failed for branch/tag while reading config: master' in exc.value.output
+    assert 'Failed to read configuration of root ref: master' in exc.value.output
     assert exc.value.output.strip().endswith('Failure.')
 
 
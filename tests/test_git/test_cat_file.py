@@ -0,0 +1,77 @@
+"""Test function in module."""
+
+import pytest
+
+from sphinxcontrib.versioning.git import cat_file, git_session, GitSession
+
+
+@pytest.mark.parametrize('contents', [True, False])
+def test(local, contents):
+    """Test looking up existing and missing objects in one batch.
+
+    :param local: conftest fixture.
+    :param bool contents: Read object contents.
+    """
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+    readme = pytest.run(local, ['git', 'rev-parse', 'HEAD:README']).strip()
+    local.join('binary.dat').write_binary(b'\x00\xff\n\nend')
+    pytest.run(local, ['git', 'add', 'binary.dat'])
+    pytest.run(local, ['git', 'commit', '-m', 'Binary.'])
+    binary = pytest.run(local, ['git', 'rev-parse', 'HEAD:binary.dat']).strip()
+
+    objects = [sha, sha + ':README', 'HEAD:binary.dat', sha + ':binary.dat', 'invalid', 'HEAD']
+    actual = cat_file(str(local), objects, contents)
+    assert [a[:2] for a in actual] == [
+        (sha, 'commit'), (readme, 'blob'), (binary, 'blob'), (None, None), (None, None), (actual[5][0], 'commit')
+    ]
+    if not contents:
+        assert [a[2] for a in actual] == [None] * 6
+        return
+    assert b'Initial commit.' in actual[0][2]
+    assert actual[1][2] == b'Dummy readme file.'
+    assert actual[2][2] == b'\x00\xff\n\nend'
+    assert b'Binary.' in actual[5][2]
+
+
+def test_empty(local):
+    """Test with nothing to look up.
+
+    :param local: conftest fixture.
+    """
+    assert cat_file(str(local), []) == list()
+
+
+def test_session(local):
+    """Test reusing the same git processes for many lookups, including objects created in between.
+
+    :param local: conftest fixture.
+    """
+    with GitSession(str(local)) as session:
+        assert session.cat_file(['HEAD'], False)[0][1] == 'commit'
+        processes = [p[1] for p in getattr(session, '_processes').values()]
+        assert len(processes) == 1
+
+        # New commit.
+        local.join('new.txt').write('new')
+        pytest.run(local, ['git', 'add', 'new.txt'])
+        pytest.run(local, ['git', 'commit', '-m', 'New.'])
+        sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+        assert session.cat_file([sha + ':new.txt'], True)[0][1:] == ('blob', b'new')
+        assert session.cat_file([sha + ':new.txt'] * 3000, False)[-1][1] == 'blob'  # More than a pipe buffer.
+        assert processes[0] in [p[1] for p in getattr(session, '_processes').values()]
+        assert len(getattr(session, '_processes')) == 2
+
+    assert processes[0].poll() is not None
+
+
+def test_shared(local, local_light):
+    """Test one shared session at a time.
+
+    :param local: conftest fixture.
+    :param local_light: conftest fixture.
+    """
+    session = git_session(str(local))
+    assert git_session(str(local)) is session
+    cat_file(str(local), ['HEAD'])
+    assert git_session(str(local_light)) is not session
+    assert not getattr(session, '_processes')
@@ -197,3 +197,54 @@ def test_multiple_remotes(tmpdir, local, remote):
         'origin2\t{} (push)'.format(origin2_push),
     ]
     assert actual == expected
+
+
+def test_reuse(tmpdir, local):
+    """Test updating a clone from a previous run instead of cloning again.
+
+    :param tmpdir: pytest fixture.
+    :param local: conftest fixture.
+    """
+    new_root = tmpdir.ensure_dir('new_root')
+    clone(str(local), str(new_root), 'origin', 'feature', '.', None)
+    new_root.join('.git', 'marker').write('')
+
+    # Leftovers from the previous run, then someone else pushes.
+    new_root.join('README').write('changed')
+    new_root.ensure('untracked', 'file.txt')
+    pytest.run(new_root, ['git', 'commit', '-am', 'Not pushed.'])
+    new_root.join('README').write('changed again')
+    pytest.run(local, ['git', 'checkout', 'feature'])
+    local.join('one.txt').write('one')
+    local.join('two.txt').write('two')
+    pytest.run(local, ['git', 'add', 'one.txt', 'two.txt'])
+    pytest.run(local, ['git', 'commit', '-m', 'Adding new files.'])
+    pytest.run(local, ['git', 'push', 'origin', 'feature'])
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    # Run.
+    clone(str(local), str(new_root), 'origin', 'feature', '.', ['two.txt'])
+    assert new_root.join('.git', 'marker').check()
+    assert pytest.run(new_root, ['git', 'rev-parse', 'HEAD']).strip() == sha
+    assert pytest.run(new_root, ['git', 'rev-parse', '--abbrev-ref', 'HEAD']).strip() == 'feature'
+    paths = sorted(f.relto(new_root) for f in new_root.visit() if new_root.join('.git') not in f.parts())
+    assert paths == ['two.txt']
+    status = pytest.run(new_root, ['git', 'status', '--porcelain'])
+    assert status == 'D  README\nD  one.txt\n'
+    assert 'origin\t' in pytest.run(new_root, ['git', 'remote', '-v'])
+
+
+def test_reuse_foreign(tmpdir, local):
+    """Test refusing to update a git repository not created by clone().
+
+    :param tmpdir: pytest fixture.
+    :param local: conftest fixture.
+    """
+    new_root = tmpdir.ensure_dir('new_root')
+    pytest.run(new_root, ['git', 'init'])
+    new_root.ensure('untracked.txt')
+
+    with pytest.raises(GitError) as exc:
+        clone(str(local), str(new_root), 'origin', 'feature', '.', None)
+    assert exc.value.message.startswith('Refusing to update git repository not cloned')
+    assert new_root.join('untracked.txt').check()
@@ -44,13 +44,12 @@ def test_nothing_to_commit(caplog, local, exclude):
 
 @pytest.mark.parametrize('subdirs', [False, True])
 def test_nothing_significant_to_commit(caplog, local, subdirs):
-    """Test ignoring of always-changing generated Sphinx files.
+    """Test ignoring of always-changing search indexes.
 
     :param caplog: pytest extension fixture.
     :param local: conftest fixture.
-    :param bool subdirs: Test these files from sub directories.
+    :param bool subdirs: Test search indexes in sub directories.
     """
-    local.ensure('sub' if subdirs else '', '.doctrees', 'file.bin').write('data')
     local.ensure('sub' if subdirs else '', 'searchindex.js').write('data')
     old_sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
     actual = commit_and_push(str(local), 'origin', Versions(REMOTES))
@@ -62,7 +61,6 @@ def test_nothing_significant_to_commit(caplog, local, subdirs):
     assert ('INFO', 'No changes to commit.') not in records
     assert ('INFO', 'No significant changes to commit.') not in records
 
-    local.ensure('sub' if subdirs else '', '.doctrees', 'file.bin').write('changed')
     local.ensure('sub' if subdirs else '', 'searchindex.js').write('changed')
     old_sha = sha
     records_seek = len(caplog.records)
@@ -114,6 +112,28 @@ def test_changes(monkeypatch, local):
     assert body == 'LANG: en_US.UTF-8\nTRAVIS_BRANCH: master\nTRAVIS_BUILD_ID: 12345'
 
 
+def test_rewritten(local):
+    """Test files rewritten with identical contents (like after "git rm" in clone()) aren't changes.
+
+    :param local: conftest fixture.
+    """
+    local.ensure('sub', 'same.txt').write('same')
+    local.ensure('sub', 'changed.txt').write('old')
+    local.ensure('sub', 'deleted.txt').write('deleted')
+    pytest.run(local, ['git', 'add', 'sub'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added files.'])
+    pytest.run(local, ['git', 'rm', '-rf', 'sub'])
+    local.ensure('sub', 'same.txt').write('same')
+    local.ensure('sub', 'changed.txt').write('new')
+    local.ensure('sub', 'new.txt').write('new')
+
+    actual = commit_and_push(str(local), 'origin', Versions(REMOTES))
+    assert actual is True
+    pytest.run(local, ['git', 'diff-index', '--quiet', 'HEAD', '--'])  # Exit 0 if nothing changed.
+    output = pytest.run(local, ['git', 'show', '--name-status', '--format=', 'HEAD']).strip()
+    assert output.splitlines() == ['M\tsub/changed.txt', 'D\tsub/deleted.txt', 'A\tsub/new.txt']
+
+
 def test_branch_deleted(local):
     """Test scenario where branch is deleted by someone.
 
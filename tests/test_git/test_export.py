@@ -66,6 +66,30 @@ def test_overwrite(tmpdir, local):
     assert paths == expected
 
 
+def test_paths(tmpdir, local):
+    """Test exporting only some files/directories.
+
+    :param tmpdir: pytest fixture.
+    :param local: conftest fixture.
+    """
+    local.ensure('docs', 'conf.py').write('one')
+    local.ensure('src', 'module.py').write('two')
+    local.ensure('other', 'file.txt').write('three')
+    pytest.run(local, ['git', 'add', 'docs', 'src', 'other'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added dirs.'])
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    target = tmpdir.ensure_dir('target')
+    export(str(local), sha, str(target), ['docs', 'src/module.py'])
+    expected = ['docs', join('docs', 'conf.py'), 'src', join('src', 'module.py')]
+    assert sorted(f.relto(target) for f in target.visit()) == expected
+
+    # Empty path means everything.
+    target = tmpdir.ensure_dir('target2')
+    export(str(local), sha, str(target), [''])
+    assert sorted(f.relto(target) for f in target.listdir()) == ['README', 'docs', 'other', 'src']
+
+
 @pytest.mark.usefixtures('outdate_local')
 @pytest.mark.parametrize('fail', [False, True])
 def test_new_branch_tags(tmpdir, local_light, fail):
@@ -95,6 +119,30 @@ def test_new_branch_tags(tmpdir, local_light, fail):
     assert target.join('README').read() == 'new'
 
 
+def test_files(tmpdir, local):
+    """Test nested directories, binary and executable files, and mtimes of non-RST files.
+
+    :param tmpdir: pytest fixture.
+    :param local: conftest fixture.
+    """
+    local.ensure('a', 'b', 'c', 'data.bin').write_binary(b'\x00\xff' * 100000)
+    local.ensure('a', 'script.sh').write('#!/bin/sh\n')
+    local.join('a', 'script.sh').chmod(0o755)
+    pytest.run(local, ['git', 'add', 'a'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added files.'], environ=pytest.author_committer_dates(1))
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    target = tmpdir.join('target')  # Doesn't exist yet.
+    export(str(local), sha, str(target))
+    assert target.join('a', 'b', 'c', 'data.bin').read_binary() == b'\x00\xff' * 100000
+    assert target.join('a', 'script.sh').read() == '#!/bin/sh\n'
+    if not IS_WINDOWS:
+        assert target.join('a', 'script.sh').stat().mode & 0o100
+        assert not target.join('README').stat().mode & 0o100
+    committed = int(pytest.run(local, ['git', 'log', '-1', '--format=%ct', sha]).strip())
+    assert int(target.join('a', 'script.sh').mtime()) == committed
+
+
 @pytest.mark.skipif(str(IS_WINDOWS))
 def test_symlink(tmpdir, local):
     """Test repos with broken symlinks.
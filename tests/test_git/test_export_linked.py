@@ -0,0 +1,132 @@
+"""Test function in module."""
+
+import pytest
+
+from sphinxcontrib.versioning.git import export_linked, IS_WINDOWS, prune_store
+
+
+def test_shared(tmpdir, local):
+    """Test two commits sharing files through the store.
+
+    :param tmpdir: pytest fixture.
+    :param local: conftest fixture.
+    """
+    local.ensure('one.rst').write('One\n')
+    local.ensure('two.rst').write('Two\n')
+    local.ensure('a', 'data.bin').write_binary(b'\x00\xff' * 1000)
+    local.ensure('a', 'script.sh').write('#!/bin/sh\n')
+    local.join('a', 'script.sh').chmod(0o755)
+    pytest.run(local, ['git', 'add', 'one.rst', 'two.rst', 'a'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added files.'], environ=pytest.author_committer_dates(1))
+    first = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+    local.join('two.rst').write('Two changed\n')
+    pytest.run(local, ['git', 'commit', '-am', 'Changed two.'], environ=pytest.author_committer_dates(2))
+    second = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+    store = tmpdir.join('store')
+
+    export_linked(str(local), first, str(tmpdir.join('first')), str(store))
+    count = len(list(store.visit(lambda p: p.check(file=True))))
+    export_linked(str(local), second, str(tmpdir.join('second')), str(store))
+    assert len(list(store.visit(lambda p: p.check(file=True)))) == count + 1  # Only two.rst was written.
+
+    # Verify contents.
+    for name in ('first', 'second'):
+        assert sorted(f.relto(tmpdir.join(name)) for f in tmpdir.join(name).visit()) == [
+            'README', 'a', 'a/data.bin', 'a/script.sh', 'one.rst', 'two.rst'
+        ]
+        assert tmpdir.join(name, 'a', 'data.bin').read_binary() == b'\x00\xff' * 1000
+        assert tmpdir.join(name, 'one.rst').read() == 'One\n'
+    assert tmpdir.join('first', 'two.rst').read() == 'Two\n'
+    assert tmpdir.join('second', 'two.rst').read() == 'Two changed\n'
+    if not IS_WINDOWS:
+        assert tmpdir.join('second', 'a', 'script.sh').stat().mode & 0o100
+        assert not tmpdir.join('second', 'README').stat().mode & 0o100
+
+    # Verify links and mtimes.
+    dates = [int(pytest.run(local, ['git', 'log', '-1', '--format=%at', s]).strip()) for s in (first, second)]
+    assert tmpdir.join('first', 'one.rst').stat().ino == tmpdir.join('second', 'one.rst').stat().ino
+    assert tmpdir.join('first', 'two.rst').stat().ino != tmpdir.join('second', 'two.rst').stat().ino
+    assert int(tmpdir.join('second', 'one.rst').mtime()) == dates[0]
+    assert int(tmpdir.join('first', 'two.rst').mtime()) == dates[0]
+    assert int(tmpdir.join('second', 'two.rst').mtime()) == dates[1]
+
+
+def test_rst_mtime(tmpdir, local):
+    """Test identical RST files committed at different times don't share one mtime.
+
+    :param tmpdir: pytest fixture.
+    :param local: conftest fixture.
+    """
+    local.ensure('old.rst').write('Same\n')
+    pytest.run(local, ['git', 'add', 'old.rst'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added old.'], environ=pytest.author_committer_dates(1))
+    local.ensure('new.rst').write('Same\n')
+    pytest.run(local, ['git', 'add', 'new.rst'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added new.'], environ=pytest.author_committer_dates(2))
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    target = tmpdir.join('target')
+    export_linked(str(local), sha, str(target), str(tmpdir.join('store')))
+    assert target.join('old.rst').mtime() + 60 == target.join('new.rst').mtime()
+    assert target.join('old.rst').stat().ino != target.join('new.rst').stat().ino
+
+
+def test_paths(tmpdir, local):
+    """Test exporting only some paths.
+
+    :param tmpdir: pytest fixture.
+    :param local: conftest fixture.
+    """
+    local.ensure('docs', 'contents.rst').write('Test\n')
+    local.ensure('src', 'module.py').write('')
+    pytest.run(local, ['git', 'add', 'docs', 'src'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added files.'])
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    target = tmpdir.join('target')
+    export_linked(str(local), sha, str(target), str(tmpdir.join('store')), ['docs'])
+    assert sorted(f.relto(target) for f in target.visit()) == ['docs', 'docs/contents.rst']
+
+
+@pytest.mark.skipif(str(IS_WINDOWS))
+def test_symlink(tmpdir, local):
+    """Test repos with symlinks. Broken symlinks are skipped.
+
+    :param tmpdir: pytest fixture.
+    :param local: conftest fixture.
+    """
+    local.join('good_symlink').mksymlinkto('README')
+    local.join('broken_symlink').mksymlinkto('to_be_removed')
+    pytest.run(local, ['git', 'add', 'good_symlink', 'broken_symlink'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added symlinks.'])
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    target = tmpdir.join('target')
+    export_linked(str(local), sha, str(target), str(tmpdir.join('store')))
+    assert sorted(f.basename for f in target.listdir()) == ['README', 'good_symlink']
+    assert target.join('good_symlink').readlink() == 'README'
+
+
+def test_prune_store(monkeypatch, tmpdir, local):
+    """Test removing files no longer linked into any export.
+
+    :param monkeypatch: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param local: conftest fixture.
+    """
+    store = tmpdir.join('store')
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+    export_linked(str(local), sha, str(tmpdir.join('target')), str(store))
+    monkeypatch.setattr('sphinxcontrib.versioning.git.BLOB_STORE_GRACE', -60)
+    assert prune_store(str(store)) == 0
+    assert tmpdir.join('target', 'README').check()
+
+    # Recently unlinked files are kept for other processes sharing the store.
+    tmpdir.join('target').remove()
+    monkeypatch.setattr('sphinxcontrib.versioning.git.BLOB_STORE_GRACE', 3600)
+    assert prune_store(str(store)) == 0
+    assert len(list(store.visit(lambda p: p.check(file=True)))) == 1
+
+    monkeypatch.setattr('sphinxcontrib.versioning.git.BLOB_STORE_GRACE', -60)
+    assert prune_store(str(store)) == 1
+    assert not list(store.visit(lambda p: p.check(file=True)))
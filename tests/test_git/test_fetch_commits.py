@@ -2,6 +2,7 @@
 
 import pytest
 
+from sphinxcontrib.versioning import git
 from sphinxcontrib.versioning.git import fetch_commits, filter_and_date, GitError, list_remote
 
 
@@ -68,3 +69,32 @@ def test_new_branch_tags(local, local_light, clone_branch):
     dates = filter_and_date(str(local), ['README'], shas)
     assert len(dates) == 3
     pytest.run(local, ['git', 'diff-index', '--quiet', 'HEAD', '--'])
+
+
+@pytest.mark.usefixtures('outdate_local')
+@pytest.mark.parametrize('depth', [0, 1])
+def test_one_fetch(monkeypatch, local, depth):
+    """Test fetching all missing branches/tags with one git command, optionally shallow.
+
+    :param monkeypatch: pytest fixture.
+    :param local: conftest fixture.
+    :param int depth: Passed to function.
+    """
+    remotes = list_remote(str(local))
+    commands = list()
+    run_command = getattr(git, 'run_command')
+    monkeypatch.setattr(git, 'run_command', lambda root, command, **kw: commands.append(command) or
+                        run_command(root, command, **kw))
+
+    fetch_commits(str(local), remotes, depth)
+    assert len(commands) == 1
+    assert sorted(c for c in commands[0] if c.startswith('refs/')) == [
+        'refs/heads/orphaned_branch', 'refs/tags/nb_tag', 'refs/tags/ob_at'
+    ]
+    assert ('--depth=1' in commands[0]) is bool(depth)
+    assert local.join('.git', 'shallow').check() is bool(depth)
+    assert len(filter_and_date(str(local), ['README'], {r[0] for r in remotes})) == 3
+
+    # Nothing to fetch.
+    fetch_commits(str(local), remotes, depth)
+    assert len(commands) == 1
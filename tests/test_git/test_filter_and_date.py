@@ -54,6 +54,21 @@ def test_three_commits_multiple_paths(local):
     assert len(dates) == 2
 
 
+def test_first_conf_rel_path(local):
+    """Test that the first matching candidate in conf_rel_paths order is selected.
+
+    :param local: conftest fixture.
+    """
+    local.ensure('b', 'conf.py').write('pass\n')
+    local.ensure('a', 'conf.py').write('pass\n')
+    pytest.run(local, ['git', 'add', 'a', 'b'])
+    pytest.run(local, ['git', 'commit', '-m', 'two'])
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    assert filter_and_date(str(local), ['b/conf.py', 'a/conf.py'], [sha])[sha][1] == 'b/conf.py'
+    assert filter_and_date(str(local), ['c/conf.py', './a/conf.py'], [sha])[sha][1] == 'a/conf.py'
+
+
 def test_multiple_commits(local):
     """Test with multiple commits.
 
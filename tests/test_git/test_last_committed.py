@@ -0,0 +1,70 @@
+"""Test function in module."""
+
+from subprocess import CalledProcessError
+
+import pytest
+
+from sphinxcontrib.versioning.git import LAST_COMMITTED, last_committed
+
+
+def test(local):
+    """Test with files changed in different commits.
+
+    :param local: conftest fixture.
+    """
+    for i, name in enumerate(('one.rst', 'two.rst', 'sub dir/three.rst')):
+        local.ensure(*name.split('/')).write(name)
+        pytest.run(local, ['git', 'add', name])
+        pytest.run(local, ['git', 'commit', '-m', 'Added ' + name], environ=pytest.author_committer_dates(i + 1))
+    local.join('one.rst').write('changed')
+    pytest.run(local, ['git', 'commit', '-am', 'Changed one.'], environ=pytest.author_committer_dates(10))
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    actual = last_committed(str(local), sha, ['README', 'one.rst', 'two.rst', 'sub dir/three.rst', 'missing.rst'])
+    expected = {
+        'README': pytest.ROOT_TS,
+        'one.rst': pytest.ROOT_TS + 600,
+        'two.rst': pytest.ROOT_TS + 120,
+        'sub dir/three.rst': pytest.ROOT_TS + 180,
+    }
+    assert actual == expected
+    assert LAST_COMMITTED[sha] == expected
+
+    with pytest.raises(CalledProcessError):
+        last_committed(str(local), 'invalid', ['README'])
+
+
+def test_shared_history(local):
+    """Test reusing results of a previously walked commit.
+
+    :param local: conftest fixture.
+    """
+    old = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+    local.join('two.rst').write('two')
+    pytest.run(local, ['git', 'add', 'two.rst'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added two.'], environ=pytest.author_committer_dates(5))
+    new = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    LAST_COMMITTED[old] = {'README': 12345}
+    assert last_committed(str(local), new, ['README', 'two.rst']) == {'README': 12345, 'two.rst': pytest.ROOT_TS + 300}
+
+
+def test_merge(local):
+    """Test cached results of a commit aren't used for history merged in from another branch.
+
+    :param local: conftest fixture.
+    """
+    LAST_COMMITTED.clear()  # Other tests cache made up results for the same root commit.
+    pytest.run(local, ['git', 'checkout', '-b', 'side'])
+    local.join('README').write('changed on side')
+    pytest.run(local, ['git', 'commit', '-am', 'Changed README.'], environ=pytest.author_committer_dates(1))
+    pytest.run(local, ['git', 'checkout', 'master'])
+    local.ensure('other.rst').write('other')
+    pytest.run(local, ['git', 'add', 'other.rst'])
+    pytest.run(local, ['git', 'commit', '-m', 'Added other.'], environ=pytest.author_committer_dates(2))
+    tag = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+    pytest.run(local, ['git', 'merge', '--no-ff', '-m', 'Merged.', 'side'], environ=pytest.author_committer_dates(3))
+    merge = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+
+    assert last_committed(str(local), tag, ['README']) == {'README': pytest.ROOT_TS}
+    assert last_committed(str(local), merge, ['README']) == {'README': pytest.ROOT_TS + 60}
@@ -1,8 +1,10 @@
 """Test function in module."""
 
+import time
+
 import pytest
 
-from sphinxcontrib.versioning.git import GitError, list_remote
+from sphinxcontrib.versioning.git import GitError, list_local_refs, list_remote
 
 
 def test_bad_remote(tmpdir, local_empty):
@@ -116,3 +118,45 @@ def test_outdated_local(tmpdir, local, remote):
     # Run list_remote() on outdated repo and verify it still gets latest refs.
     remotes = list_remote(str(local_outdated))
     assert remotes == expected
+
+
+def test_ttl(monkeypatch, local):
+    """Test reusing results of previous calls.
+
+    :param monkeypatch: pytest fixture.
+    :param local: conftest fixture.
+    """
+    expected = list_remote(str(local), ttl=60)
+    pytest.run(local, ['git', 'tag', 'new_tag'])
+    pytest.run(local, ['git', 'push', 'origin', 'new_tag'])
+
+    # Cached.
+    remotes = list_remote(str(local), ttl=60)
+    assert remotes == expected
+    remotes.pop()  # Callers can't change what's in the cache.
+    assert list_remote(str(local), ttl=60) == expected
+
+    # Not cached.
+    assert [r[1] for r in list_remote(str(local))] == ['feature', 'master', 'annotated_tag', 'light_tag', 'new_tag']
+
+    # Expired.
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert len(list_remote(str(local), ttl=60)) == 5
+
+
+def test_local_refs(local):
+    """Test reading local remote-tracking branches and tags.
+
+    :param local: conftest fixture.
+    """
+    pytest.run(local, ['git', 'tag', '--annotate', '-m', 'Tag annotation.', 'v1.0'])
+    pytest.run(local, ['git', 'push', 'origin', 'v1.0'])
+    pytest.run(local, ['git', 'remote', 'set-head', 'origin', 'master'])
+    assert list_local_refs(str(local)) == list_remote(str(local))
+
+    # Local changes not pushed aren't seen in branches.
+    sha = pytest.run(local, ['git', 'rev-parse', 'HEAD']).strip()
+    local.join('README').write('changed')
+    pytest.run(local, ['git', 'commit', '-am', 'Changed'])
+    assert [sha, 'master', 'heads'] in list_local_refs(str(local))
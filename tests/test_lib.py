@@ -26,12 +26,23 @@ def test_config():
         ('banner_greatest_tag', False),
         ('banner_main_ref', 'master'),
         ('banner_recent_tag', False),
+        ('cache_dir', None),
+        ('cache_limit', 50),
         ('chdir', None),
+        ('clone_dir', None),
+        ('export_docs_only', False),
+        ('export_include', tuple()),
+        ('fetch_depth', 0),
         ('git_root', None),
         ('greatest_tag', False),
         ('grm_exclude', tuple()),
+        ('hardlink_exports', False),
+        ('incremental', False),
         ('invert', True),
+        ('jobs', 1),
         ('local_conf', None),
+        ('local_refs', False),
+        ('ls_remote_ttl', 0),
         ('no_colors', False),
         ('no_local_conf', False),
         ('overflow', ('-D', 'key=value')),
@@ -41,7 +52,10 @@ def test_config():
         ('root_ref', 'master'),
         ('show_banner', False),
         ('sort', tuple()),
+        ('validate', False),
+        ('validate_summary', None),
         ('verbose', 1),
+        ('versions_json', False),
         ('whitelist_branches', tuple()),
         ('whitelist_tags', tuple()),
     ]
@@ -1,5 +1,6 @@
 """Test function in module."""
 
+import json
 import re
 from os.path import join
 
@@ -7,7 +8,8 @@ import pytest
 
 from sphinxcontrib.versioning.git import export
 from sphinxcontrib.versioning.lib import HandledError
-from sphinxcontrib.versioning.routines import build_all, gather_git_info
+from sphinxcontrib.versioning.routines import build_all, CACHE_DOCTREES_DIR, gather_git_info, MANIFEST_FILE
+from sphinxcontrib.versioning.sphinx_ import VERSIONS_JSON_FILE
 from sphinxcontrib.versioning.versions import Versions
 
 RE_LAST_UPDATED = re.compile(r'Last updated[^\n]+\n')
@@ -31,24 +33,24 @@ def test_single(tmpdir, local_docs, urls):
     build_all(str(exported_root), str(destination), versions)
     actual = sorted(f.relto(destination) for f in destination.visit() if f.check(dir=True))
     expected = [
-        '.doctrees',
         '_sources',
         '_static',
         'master',
-        join('master', '.doctrees'),
         join('master', '_sources'),
         join('master', '_static'),
     ]
     assert actual == expected
+    assert exported_root.join(CACHE_DOCTREES_DIR).listdir()[0].join('environment.pickle').check()  # Not published.
 
     # Verify HTML links.
     urls(destination.join('contents.html'), ['<li><a href="master/contents.html">master</a></li>'])
     urls(destination.join('master', 'contents.html'), ['<li><a href="contents.html">master</a></li>'])
 
 
+@pytest.mark.parametrize('jobs', [1, 3])
 @pytest.mark.parametrize('parallel', [False, True])
 @pytest.mark.parametrize('triple', [False, True])
-def test_multiple(tmpdir, config, local_docs, urls, triple, parallel):
+def test_multiple(tmpdir, config, local_docs, urls, triple, parallel, jobs):
     """With two or three versions.
 
     :param tmpdir: pytest fixture.
@@ -57,7 +59,9 @@ def test_multiple(tmpdir, config, local_docs, urls, triple, parallel):
     :param urls: conftest fixture.
     :param bool triple: With three versions (including master) instead of two.
     :param bool parallel: Run sphinx-build with -j option.
+    :param int jobs: Number of versions to build concurrently.
     """
+    config.jobs = jobs
     config.overflow = ('-j', '2') if parallel else tuple()
     pytest.run(local_docs, ['git', 'tag', 'v1.0.0'])
     pytest.run(local_docs, ['git', 'push', 'origin', 'v1.0.0'])
@@ -76,22 +80,18 @@ def test_multiple(tmpdir, config, local_docs, urls, triple, parallel):
     build_all(str(exported_root), str(destination), versions)
     actual = sorted(f.relto(destination) for f in destination.visit() if f.check(dir=True))
     expected = [
-        '.doctrees',
         '_sources',
         '_static',
         'master',
-        join('master', '.doctrees'),
         join('master', '_sources'),
         join('master', '_static'),
         'v1.0.0',
-        join('v1.0.0', '.doctrees'),
         join('v1.0.0', '_sources'),
         join('v1.0.0', '_static'),
     ]
     if triple:
         expected.extend([
             'v1.0.1',
-            join('v1.0.1', '.doctrees'),
             join('v1.0.1', '_sources'),
             join('v1.0.1', '_static'),
         ])
@@ -276,6 +276,170 @@ def test_banner_tag(tmpdir, banner, config, local_docs, recent):
     banner(dst.join(old, 'two.html'), '', 'an old version of Python')
 
 
+def test_incremental(tmpdir, config, local_docs):
+    """Test skipping versions that haven't changed since the previous build.
+
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    """
+    config.incremental = True
+    pytest.run(local_docs, ['git', 'tag', 'v1.0.0'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'v1.0.0'])
+    exported_root = tmpdir.ensure_dir('exported_root')
+    destination = tmpdir.ensure_dir('destination')
+    pages = [destination.join('contents.html'), destination.join('master', 'contents.html'),
+             destination.join('v1.0.0', 'contents.html')]
+
+    def run():
+        """Export and build all.
+
+        :return: Versions class instance.
+        :rtype: sphinxcontrib.versioning.versions.Versions
+        """
+        versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+        for remote in versions.remotes:
+            if not exported_root.join(remote['sha']).check():
+                export(str(local_docs), remote['sha'], str(exported_root.join(remote['sha'])))
+        build_all(str(exported_root), str(destination), versions)
+        for page in pages:
+            if page.check():
+                page.write('<!-- OLD -->', mode='a')
+        return versions
+
+    # First run.
+    versions = run()
+    manifest = json.loads(destination.join(MANIFEST_FILE).read())
+    assert manifest['root']['id'] == 'heads/master'
+    assert sorted(manifest['refs']) == ['heads/master', 'tags/v1.0.0']
+    assert manifest['refs']['tags/v1.0.0']['sha'] == versions['v1.0.0']['sha']
+
+    # Nothing changed.
+    run()
+    assert [p.read().count('<!-- OLD -->') for p in pages] == [2, 2, 2]
+
+    # Only master changed.
+    local_docs.join('one.rst').write('Changed\n', mode='a')
+    pytest.run(local_docs, ['git', 'commit', '-am', 'Changed one.'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'master'])
+    run()
+    assert [p.read().count('<!-- OLD -->') for p in pages] == [1, 1, 3]
+
+    # New tag changes list of versions in every page.
+    pytest.run(local_docs, ['git', 'tag', 'v2.0.0'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'v2.0.0'])
+    run()
+    assert [p.read().count('<!-- OLD -->') for p in pages] == [1, 1, 1]
+
+    # Deleted docs are rebuilt.
+    destination.join('v1.0.0').remove()
+    run()
+    assert [p.read().count('<!-- OLD -->') for p in pages] == [2, 2, 1]
+
+
+def test_versions_json(tmpdir, config, local_docs):
+    """Test writing versions.json and only building new versions with --incremental.
+
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    """
+    config.incremental = True
+    config.versions_json = True
+    exported_root = tmpdir.ensure_dir('exported_root')
+    destination = tmpdir.ensure_dir('destination')
+    pages = [destination.join('contents.html'), destination.join('master', 'contents.html')]
+
+    def run():
+        """Export and build all."""
+        versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+        for remote in versions.remotes:
+            if not exported_root.join(remote['sha']).check():
+                export(str(local_docs), remote['sha'], str(exported_root.join(remote['sha'])))
+            remote['found_docs'] = ('contents',)
+        build_all(str(exported_root), str(destination), versions)
+        for page in pages:
+            page.write('<!-- OLD -->', mode='a')
+
+    # First run.
+    run()
+    remotes = json.loads(destination.join(VERSIONS_JSON_FILE).read())['remotes']
+    expected = [dict(found_docs=['contents'], kind='heads', master_doc='contents', name='master', root_dir='master')]
+    assert remotes == expected
+    assert 'master/contents.html' not in pages[0].read()
+
+    # New tag only builds the tag and updates versions.json.
+    pytest.run(local_docs, ['git', 'tag', 'v1.0.0'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'v1.0.0'])
+    run()
+    assert [p.read().count('<!-- OLD -->') for p in pages] == [2, 2]
+    assert destination.join('v1.0.0', 'contents.html').check()
+    remotes = json.loads(destination.join(VERSIONS_JSON_FILE).read())['remotes']
+    assert [r['name'] for r in remotes] == ['master', 'v1.0.0']
+
+
+def test_cache_dir_doctrees(capfd, tmpdir, config, local_docs):
+    """Test keeping doctrees in the cache directory and reusing them in the next run.
+
+    :param capfd: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    """
+    config.cache_dir = str(tmpdir.ensure_dir('cache'))
+    versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+    exported_root = tmpdir.join('cache')  # Returned by pre_build() with --cache-dir.
+    export(str(local_docs), versions['master']['sha'], str(exported_root.join(versions['master']['sha'])))
+
+    # First run.
+    build_all(str(exported_root), str(tmpdir.ensure_dir('destination1')), versions)
+    assert '4 added, 0 changed, 0 removed' in ''.join(capfd.readouterr())
+    doctrees = tmpdir.join('cache', CACHE_DOCTREES_DIR).listdir()
+    assert len(doctrees) == 2  # Root and master.
+    assert all(d.join('environment.pickle').check() for d in doctrees)
+    assert not tmpdir.join('destination1', '.doctrees').check()
+    assert not tmpdir.join('destination1', 'master', '.doctrees').check()
+
+    # Second run doesn't read any documents.
+    build_all(str(exported_root), str(tmpdir.ensure_dir('destination2')), versions)
+    output = ''.join(capfd.readouterr())
+    assert '4 added' not in output
+    assert '0 added, 0 changed, 0 removed' in output
+    assert tmpdir.join('destination2', 'master', 'contents.html').check()
+
+
+def test_cache_dir_changed(tmpdir, config, local_docs):
+    """Test changed documents are written by both the root ref's build and its own build with a cache directory.
+
+    Both builds read the same source directory, they must not share doctrees or the second build sees no changes.
+
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    """
+    config.cache_dir = str(tmpdir.ensure_dir('cache'))
+    exported_root = tmpdir.join('cache')
+    destination = tmpdir.ensure_dir('destination')
+
+    def run():
+        """Export and build all."""
+        versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+        export(str(local_docs), versions['master']['sha'], str(exported_root.join(versions['master']['sha'])))
+        build_all(str(exported_root), str(destination), versions)
+
+    # First run.
+    run()
+    assert 'Changed' not in destination.join('master', 'one.html').read()
+
+    # Second run after changing one.rst.
+    local_docs.join('one.rst').write('\nChanged\n', mode='a')
+    pytest.run(local_docs, ['git', 'commit', '-am', 'Changed one.'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'master'])
+    run()
+    assert 'Changed' in destination.join('one.html').read()
+    assert 'Changed' in destination.join('master', 'one.html').read()
+
+
 def test_last_updated(tmpdir, local_docs):
     """Test last updated timestamp derived from git authored time.
 
@@ -321,8 +485,9 @@ def test_last_updated(tmpdir, local_docs):
     assert three == ['Last updated on Dec 5, 2016, 3:28:05 AM.\n']
 
 
+@pytest.mark.parametrize('jobs', [1, 3])
 @pytest.mark.parametrize('parallel', [False, True])
-def test_error(tmpdir, config, local_docs, urls, parallel):
+def test_error(tmpdir, config, local_docs, urls, parallel, jobs):
     """Test with a bad root ref. Also test skipping bad non-root refs.
 
     :param tmpdir: pytest fixture.
@@ -330,7 +495,9 @@ def test_error(tmpdir, config, local_docs, urls, parallel):
     :param local_docs: conftest fixture.
     :param urls: conftest fixture.
     :param bool parallel: Run sphinx-build with -j option.
+    :param int jobs: Number of versions to build concurrently.
     """
+    config.jobs = jobs
     config.overflow = ('-j', '2') if parallel else tuple()
     pytest.run(local_docs, ['git', 'checkout', '-b', 'a_good', 'master'])
     pytest.run(local_docs, ['git', 'checkout', '-b', 'c_good', 'master'])
@@ -413,3 +580,67 @@ def test_all_errors(tmpdir, local_docs, urls):
     # Verify root HTML links.
     urls(destination.join('contents.html'), ['<li><a href="master/contents.html">master</a></li>'])
     urls(destination.join('master', 'contents.html'), ['<li><a href="contents.html">master</a></li>'])
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_error_no_reread(capfd, tmpdir, config, local_docs, jobs):
+    """Test refs built before another ref failed aren't read again, only their HTML pages are rewritten.
+
+    :param capfd: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    :param int jobs: Number of versions to build concurrently.
+    """
+    config.jobs = jobs
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'a_good', 'master'])
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'b_broken', 'master'])
+    local_docs.join('conf.py').write('master_doc = exception\n')
+    pytest.run(local_docs, ['git', 'commit', '-am', 'Broken version.'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'a_good', 'b_broken'])
+
+    versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+
+    exported_root = tmpdir.ensure_dir('exported_root')
+    export(str(local_docs), versions['master']['sha'], str(exported_root.join(versions['master']['sha'])))
+    export(str(local_docs), versions['b_broken']['sha'], str(exported_root.join(versions['b_broken']['sha'])))
+
+    # Run.
+    destination = tmpdir.ensure_dir('destination')
+    build_all(str(exported_root), str(destination), versions)
+    assert [r['name'] for r in versions.remotes] == ['a_good', 'master']
+    output = ''.join(capfd.readouterr())
+    assert output.count('updating environment: 4 added') == 3  # Root, a_good, and master.
+    assert output.count('updating environment: 0 added, 0 changed, 0 removed') == 3  # Same after b_broken failed.
+    assert 'b_broken' not in destination.join('a_good', 'contents.html').read()
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_error_versions_json(capfd, tmpdir, config, local_docs, jobs):
+    """Test nothing is built again after a ref fails when pages load the list of versions from a JSON file.
+
+    :param capfd: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    :param int jobs: Number of versions to build concurrently.
+    """
+    config.jobs = jobs
+    config.versions_json = True
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'b_broken', 'master'])
+    local_docs.join('conf.py').write('master_doc = exception\n')
+    pytest.run(local_docs, ['git', 'commit', '-am', 'Broken version.'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'b_broken'])
+
+    versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+
+    exported_root = tmpdir.ensure_dir('exported_root')
+    export(str(local_docs), versions['master']['sha'], str(exported_root.join(versions['master']['sha'])))
+    export(str(local_docs), versions['b_broken']['sha'], str(exported_root.join(versions['b_broken']['sha'])))
+
+    # Run.
+    destination = tmpdir.ensure_dir('destination')
+    build_all(str(exported_root), str(destination), versions)
+    output = ''.join(capfd.readouterr())
+    assert output.count('updating environment:') == 2  # Root and master, built once.
+    assert [r['name'] for r in json.loads(destination.join(VERSIONS_JSON_FILE).read())['remotes']] == ['master']
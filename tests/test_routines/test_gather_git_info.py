@@ -19,6 +19,20 @@ def test_working(local):
     assert [i[1:-2] for i in filtered_remotes] == expected
 
 
+def test_local_refs(monkeypatch, config, local):
+    """Test reading branches/tags from the local repository instead of the remote.
+
+    :param monkeypatch: pytest fixture.
+    :param config: conftest fixture.
+    :param local: conftest fixture.
+    """
+    config.local_refs = True
+    monkeypatch.setattr('sphinxcontrib.versioning.routines.list_remote', lambda *_: pytest.fail('Listed remote.'))
+    filtered_remotes = gather_git_info(str(local), [os.path.join('.', 'README')], tuple(), tuple())
+    expected = [['feature', 'heads'], ['master', 'heads'], ['annotated_tag', 'tags'], ['light_tag', 'tags']]
+    assert [i[1:-2] for i in filtered_remotes] == expected
+
+
 @pytest.mark.parametrize('wlb', [False, True])
 @pytest.mark.parametrize('wlt', [False, True])
 def test_whitelisting(local, wlb, wlt):
@@ -1,31 +1,35 @@
 """Test function in module."""
 
+import os
 import posixpath
 
 import py
 import pytest
 
 from sphinxcontrib.versioning.lib import HandledError
-from sphinxcontrib.versioning.routines import gather_git_info, pre_build
+from sphinxcontrib.versioning.routines import CACHE_BLOBS_DIR, gather_git_info, pre_build
 from sphinxcontrib.versioning.versions import Versions
 
 
-def test_single(local_docs):
+def test_single(monkeypatch, local_docs):
     """With single version.
 
+    :param monkeypatch: pytest fixture.
     :param local_docs: conftest fixture.
     """
+    monkeypatch.setattr('sphinxcontrib.versioning.routines.build', lambda *_: pytest.fail('Built docs.'))
     versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
     assert len(versions) == 1
 
     # Run and verify directory.
     exported_root = py.path.local(pre_build(str(local_docs), versions))
     assert len(exported_root.listdir()) == 1
-    assert exported_root.join(versions['master']['sha'], 'conf.py').read() == ''
+    assert exported_root.join(versions['master']['tree'], 'conf.py').read() == ''
 
     # Verify root_dir and master_doc..
     expected = ['master/contents']
     assert sorted(posixpath.join(r['root_dir'], r['master_doc']) for r in versions.remotes) == expected
+    assert versions['master']['found_docs'] == frozenset(['contents', 'one', 'three', 'two'])
 
 
 def test_dual(local_docs):
@@ -51,14 +55,172 @@ def test_dual(local_docs):
     # Run and verify directory.
     exported_root = py.path.local(pre_build(str(local_docs), versions))
     assert len(exported_root.listdir()) == 2
-    assert exported_root.join(versions['master']['sha'], 'conf.py').read() == ''
-    assert exported_root.join(versions['feature']['sha'], 'conf.py').read() == 'master_doc = "index"\n'
+    assert exported_root.join(versions['master']['tree'], 'conf.py').read() == ''
+    assert exported_root.join(versions['feature']['tree'], 'conf.py').read() == 'master_doc = "index"\n'
 
     # Verify versions root_dirs and master_docs.
     expected = ['feature/index', 'master/contents']
     assert sorted(posixpath.join(r['root_dir'], r['master_doc']) for r in versions.remotes) == expected
 
 
+def test_identical_trees(monkeypatch, local_docs):
+    """Test refs with different commits but identical files share one export and one config read.
+
+    :param monkeypatch: pytest fixture.
+    :param local_docs: conftest fixture.
+    """
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'other', 'master'])
+    pytest.run(local_docs, ['git', 'commit', '--allow-empty', '-m', 'Empty commit.'])
+    pytest.run(local_docs, ['git', 'tag', 'v1.0.0'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'other', 'v1.0.0'])
+    calls = list()
+    read = dict(found_docs=('contents',), master_doc='contents', output_names=frozenset())
+    monkeypatch.setattr('sphinxcontrib.versioning.routines.read_configs', lambda sources, _: [
+        calls.append(s[1]) or read for s in sources
+    ])
+
+    versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+    assert len(versions) == 3
+    assert versions['master']['sha'] != versions['other']['sha']
+
+    # Run and verify directory.
+    exported_root = py.path.local(pre_build(str(local_docs), versions))
+    assert len(exported_root.listdir()) == 1
+    assert versions['master']['tree'] == versions['other']['tree'] == versions['v1.0.0']['tree']
+    assert exported_root.listdir()[0].basename == versions['master']['tree']
+    assert len(calls) == 1
+    assert versions['master']['found_docs'] is versions['other']['found_docs']
+
+    # Verify versions root_dirs and master_docs.
+    expected = ['master/contents', 'other/contents', 'v1.0.0/contents']
+    assert sorted(posixpath.join(r['root_dir'], r['master_doc']) for r in versions.remotes) == expected
+
+
+@pytest.mark.parametrize('include', [False, True])
+def test_docs_only(config, local_docs, include):
+    """Test exporting only the docs directory, optionally with additional paths.
+
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    :param bool include: Also export additional paths.
+    """
+    local_docs.ensure('docs', 'conf.py').write('')
+    local_docs.ensure('docs', 'contents.rst').write('Test\n====\n')
+    local_docs.ensure('src', 'module.py').write('')
+    pytest.run(local_docs, ['git', 'add', 'docs', 'src'])
+    pytest.run(local_docs, ['git', 'commit', '-m', 'Docs subdirectory.'])
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'other'])
+    local_docs.join('README').write('changed')
+    pytest.run(local_docs, ['git', 'commit', '-am', 'Changed README.'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'master', 'other'])
+    config.export_docs_only = True
+    if include:
+        config.export_include = ('src', 'does_not_exist')
+
+    versions = Versions(gather_git_info(str(local_docs), ['docs/conf.py'], tuple(), tuple()))
+    assert len(versions) == 2
+
+    # Run and verify directory. Both refs have identical docs so they share one export.
+    exported_root = py.path.local(pre_build(str(local_docs), versions))
+    assert versions['master']['tree'] == versions['other']['tree']
+    assert len(exported_root.listdir()) == 1
+    exported = exported_root.join(versions['master']['tree'])
+    expected = ['docs', 'src'] if include else ['docs']
+    assert sorted(f.basename for f in exported.listdir()) == expected
+
+    # Verify versions root_dirs and master_docs.
+    expected = ['master/contents', 'other/contents']
+    assert sorted(posixpath.join(r['root_dir'], r['master_doc']) for r in versions.remotes) == expected
+
+
+def test_docs_moved(config, local_docs):
+    """Test exporting only the docs directory when identical docs are in a different directory in another ref.
+
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    """
+    local_docs.ensure('docs', 'conf.py').write('')
+    local_docs.ensure('docs', 'contents.rst').write('Test\n====\n')
+    pytest.run(local_docs, ['git', 'add', 'docs'])
+    pytest.run(local_docs, ['git', 'commit', '-m', 'Docs subdirectory.'])
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'other'])
+    pytest.run(local_docs, ['git', 'mv', 'docs', 'doc'])
+    pytest.run(local_docs, ['git', 'commit', '-m', 'Moved docs.'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'master', 'other'])
+    config.export_docs_only = True
+
+    versions = Versions(gather_git_info(str(local_docs), ['docs/conf.py', 'doc/conf.py'], tuple(), tuple()))
+    assert len(versions) == 2
+
+    # Run and verify directory. Subtrees are identical but at different paths so refs don't share an export.
+    exported_root = py.path.local(pre_build(str(local_docs), versions))
+    assert len(versions) == 2
+    assert versions['master']['tree'] != versions['other']['tree']
+    assert exported_root.join(versions['master']['tree'], 'docs', 'conf.py').check(file=True)
+    assert exported_root.join(versions['other']['tree'], 'doc', 'conf.py').check(file=True)
+
+
+def test_cache_dir(monkeypatch, tmpdir, config, local_docs):
+    """Test reusing exports from a persistent cache directory in later runs.
+
+    :param monkeypatch: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    """
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'other'])
+    local_docs.join('README').write('changed')
+    pytest.run(local_docs, ['git', 'commit', '-am', 'Changed README.'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'other'])
+    cache_dir = tmpdir.ensure_dir('cache')
+    os.utime(str(cache_dir.ensure_dir('0' * 40)), (1000, 1000))  # Stale export.
+    config.cache_dir = str(cache_dir)
+    config.cache_limit = 2
+
+    # First run exports into the cache and evicts the stale entry.
+    versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+    assert pre_build(str(local_docs), versions) == str(cache_dir)
+    expected = sorted([versions['master']['tree'], versions['other']['tree']])
+    assert sorted(f.basename for f in cache_dir.listdir()) == expected
+    assert cache_dir.join(versions['other']['tree'], 'README').read() == 'changed'
+
+    # Second run doesn't export.
+    calls = list()
+    monkeypatch.setattr('sphinxcontrib.versioning.routines.export', lambda *a: calls.append(a))
+    versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+    pre_build(str(local_docs), versions)
+    assert not calls
+    assert sorted(f.basename for f in cache_dir.listdir()) == expected
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_hardlink_exports(tmpdir, config, local_docs, cached):
+    """Test exporting through the blob store, with or without a persistent cache directory.
+
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    :param bool cached: Use a cache directory.
+    """
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'other'])
+    local_docs.join('README').write('changed')
+    pytest.run(local_docs, ['git', 'commit', '-am', 'Changed README.'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'other'])
+    config.hardlink_exports = True
+    if cached:
+        config.cache_dir = str(tmpdir.ensure_dir('cache'))
+
+    versions = Versions(gather_git_info(str(local_docs), ['conf.py'], tuple(), tuple()))
+    exported_root = py.path.local(pre_build(str(local_docs), versions))
+    master, other = (exported_root.join(versions[n]['tree']) for n in ('master', 'other'))
+    assert sorted(f.basename for f in exported_root.listdir()) == sorted([CACHE_BLOBS_DIR, master.basename,
+                                                                         other.basename])
+    assert other.join('README').read() == 'changed'
+    assert master.join('contents.rst').stat().ino == other.join('contents.rst').stat().ino
+    assert master.join('README').stat().ino != other.join('README').stat().ino
+    assert versions['other']['found_docs'] == frozenset(['contents', 'one', 'three', 'two'])
+
+
 def test_file_collision(local_docs):
     """Test handling of filename collisions between generates files from root and branch names.
 
@@ -0,0 +1,73 @@
+"""Test function in module."""
+
+import os
+
+from sphinxcontrib.versioning.routines import CACHE_BLOBS_DIR, CACHE_TEMP_PREFIX, prune_cache
+
+
+def test(tmpdir):
+    """Test removing least recently used exports.
+
+    :param tmpdir: pytest fixture.
+    """
+    a, b, c, d, e = (n * 40 for n in 'abcde')
+    for i, name in enumerate((a, b, c, d, e)):
+        os.utime(str(tmpdir.ensure_dir(name)), (1000 + i, 1000 + i))
+    tmpdir.ensure_dir(CACHE_TEMP_PREFIX + 'in_progress')
+    os.utime(str(tmpdir.ensure_dir(CACHE_TEMP_PREFIX + 'abandoned')), (999, 999))
+    os.utime(str(tmpdir.ensure_dir('node_modules')), (999, 999))
+    tmpdir.ensure('file.txt')
+
+    # Under the limit. Old partial exports are removed anyway.
+    assert prune_cache(str(tmpdir), [a], 10) == []
+    assert len(tmpdir.listdir()) == 8
+    assert not tmpdir.join(CACHE_TEMP_PREFIX + 'abandoned').check()
+
+    # Oldest removed first, except the ones in use. Directories not named like exports are never removed.
+    assert prune_cache(str(tmpdir), [a], 3) == [b, c]
+    expected = [CACHE_TEMP_PREFIX + 'in_progress', a, d, e, 'file.txt', 'node_modules']
+    assert sorted(f.basename for f in tmpdir.listdir()) == expected
+
+    # More in use than the limit.
+    assert prune_cache(str(tmpdir), [a, d, e], 1) == []
+
+
+def test_blob_store(monkeypatch, tmpdir):
+    """Test removing files in the blob store only linked into removed exports.
+
+    :param monkeypatch: pytest fixture.
+    :param tmpdir: pytest fixture.
+    """
+    monkeypatch.setattr('sphinxcontrib.versioning.git.BLOB_STORE_GRACE', -60)  # Test files were just unlinked.
+    store = tmpdir.ensure_dir(CACHE_BLOBS_DIR)
+    for i, name in enumerate(('a', 'b')):
+        store.ensure('ab', name).write(name)
+        os.link(str(store.join('ab', name)), str(tmpdir.ensure_dir(name * 40).join('file')))
+        os.utime(str(tmpdir.join(name * 40)), (1000 + i, 1000 + i))
+
+    assert prune_cache(str(tmpdir), ['b' * 40], 1) == ['a' * 40]
+    assert sorted(f.basename for f in tmpdir.listdir()) == ['b' * 40, CACHE_BLOBS_DIR]
+    assert [f.basename for f in store.join('ab').listdir()] == ['b']
+
+
+def test_sha256(tmpdir):
+    """Test removing exports named after SHA-256 tree hashes.
+
+    :param tmpdir: pytest fixture.
+    """
+    for i, name in enumerate(('a' * 64, 'b' * 64, 'c' * 63)):
+        os.utime(str(tmpdir.ensure_dir(name)), (1000 + i, 1000 + i))
+    assert prune_cache(str(tmpdir), ['b' * 64], 1) == ['a' * 64]
+    assert sorted(f.basename for f in tmpdir.listdir()) == ['b' * 64, 'c' * 63]
+
+
+def test_recently_used(tmpdir):
+    """Test keeping exports recently used by other processes even when over the limit.
+
+    :param tmpdir: pytest fixture.
+    """
+    os.utime(str(tmpdir.ensure_dir('a' * 40)), (1000, 1000))
+    tmpdir.ensure_dir('b' * 40)  # Just used by another process.
+    tmpdir.ensure_dir('c' * 40)
+    assert prune_cache(str(tmpdir), ['c' * 40], 1) == ['a' * 40]
+    assert sorted(f.basename for f in tmpdir.listdir()) == ['b' * 40, 'c' * 40]
@@ -1,5 +1,6 @@
 """Test function in module."""
 
+import click
 import pytest
 
 from sphinxcontrib.versioning.routines import read_local_conf
@@ -54,3 +55,32 @@ def test_settings(tmpdir):
 
     # Verify.
     assert config == dict(root_ref='feature')
+
+
+@pytest.mark.parametrize('key', ['cache_limit', 'fetch_depth', 'jobs', 'ls_remote_ttl'])
+@pytest.mark.parametrize('value', ['0', '-1', '"many"'])
+def test_invalid_int(tmpdir, key, value):
+    """Test rejecting integer settings the command line options would reject.
+
+    :param tmpdir: pytest fixture.
+    :param str key: Setting name.
+    :param str value: Python literal in conf.py.
+    """
+    tmpdir.ensure('contents.rst')
+    local_conf = tmpdir.join('conf.py')
+    local_conf.write('scv_{} = {}\n'.format(key, value))
+
+    with pytest.raises(click.BadParameter) as exc:
+        read_local_conf(str(local_conf))
+    assert exc.value.param_hint == 'scv_' + key
+
+
+def test_valid_int(tmpdir):
+    """Test integer settings are passed through.
+
+    :param tmpdir: pytest fixture.
+    """
+    tmpdir.ensure('contents.rst')
+    local_conf = tmpdir.join('conf.py')
+    local_conf.write('scv_jobs = 2\nscv_cache_limit = "5"\n')
+    assert read_local_conf(str(local_conf)) == dict(cache_limit=5, jobs=2)
@@ -0,0 +1,82 @@
+"""Test function in module."""
+
+import json
+
+import pytest
+
+from sphinxcontrib.versioning.lib import HandledError
+from sphinxcontrib.versioning.routines import build_all, gather_git_info, pre_build, validate_all
+from sphinxcontrib.versioning.versions import Versions
+
+
+@pytest.fixture
+def local_broken(local_docs):
+    """Add branches a_good and b_broken. b_broken has a readable conf.py but fails while reading documents.
+
+    :param local_docs: conftest fixture.
+
+    :return: Local repo.
+    """
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'a_good', 'master'])
+    pytest.run(local_docs, ['git', 'checkout', '-b', 'b_broken', 'master'])
+    local_docs.join('conf.py').write(
+        'def setup(app):\n'
+        '    app.connect("source-read", lambda *_: 1 / 0)\n'
+    )
+    pytest.run(local_docs, ['git', 'commit', '-am', 'Broken version.'])
+    pytest.run(local_docs, ['git', 'checkout', 'master'])
+    pytest.run(local_docs, ['git', 'push', 'origin', 'a_good', 'b_broken'])
+    return local_docs
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_skip_broken(capfd, tmpdir, config, local_broken, jobs):
+    """Test dropping a broken ref before building HTML without reading documents of good refs twice.
+
+    :param capfd: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_broken: local fixture.
+    :param int jobs: Number of versions to validate concurrently.
+    """
+    config.jobs = jobs
+    config.validate_summary = str(tmpdir.join('summary.json'))
+    versions = Versions(gather_git_info(str(local_broken), ['conf.py'], tuple(), tuple()), sort=['alpha'])
+    exported_root = pre_build(str(local_broken), versions)
+    assert [r['name'] for r in versions.remotes] == ['a_good', 'b_broken', 'master']
+
+    # Validate.
+    destination = tmpdir.ensure_dir('destination')
+    summary = validate_all(exported_root, versions)
+    assert [r['name'] for r in versions.remotes] == ['a_good', 'master']
+    assert summary['failed'] == ['b_broken']
+    assert [(r['name'], r['passed']) for r in summary['refs']] == [('a_good', True), ('b_broken', False),
+                                                                   ('master', True)]
+    assert json.loads(tmpdir.join('summary.json').read()) == summary
+    assert not destination.join('a_good', 'contents.html').check()  # No HTML yet.
+
+    # Build HTML. Only root reads documents, refs reuse doctrees from validation.
+    capfd.readouterr()
+    build_all(exported_root, str(destination), versions)
+    assert [r['name'] for r in versions.remotes] == ['a_good', 'master']
+    output = ''.join(capfd.readouterr())
+    assert output.count('updating environment: 4 added') == 1
+    assert output.count('updating environment: 0 added, 0 changed, 0 removed') == 2
+    assert 'b_broken' not in destination.join('contents.html').read()
+
+
+def test_root_broken(tmpdir, config, local_broken):
+    """Test with a bad root ref.
+
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_broken: local fixture.
+    """
+    config.root_ref = 'b_broken'
+    config.validate_summary = str(tmpdir.join('summary.json'))
+    versions = Versions(gather_git_info(str(local_broken), ['conf.py'], tuple(), tuple()))
+    exported_root = pre_build(str(local_broken), versions)
+
+    with pytest.raises(HandledError):
+        validate_all(exported_root, versions)
+    assert json.loads(tmpdir.join('summary.json').read())['failed'] == ['b_broken']
@@ -3,7 +3,7 @@
 import pytest
 
 from sphinxcontrib.versioning.lib import HandledError
-from sphinxcontrib.versioning.sphinx_ import build
+from sphinxcontrib.versioning.sphinx_ import build, build_many
 from sphinxcontrib.versioning.versions import Versions
 
 
@@ -85,6 +85,130 @@ def test_sphinx_error(tmpdir, local_docs):
         build(str(local_docs), str(target), versions, 'master', True)
 
 
+@pytest.mark.parametrize('jobs', [1, 2, 4])
+def test_build_many(capfd, tmpdir, local_docs, urls, jobs):
+    """Verify concurrent builds with one bad version.
+
+    :param capfd: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param local_docs: conftest fixture.
+    :param urls: conftest fixture.
+    :param int jobs: Number of versions to build concurrently.
+    """
+    versions = Versions([('', n, 'heads', 1, 'conf.py') for n in ('a', 'b', 'c')])
+    broken = tmpdir.ensure_dir('broken')
+    broken.join('conf.py').write('undefined')
+
+    builds = [
+        (str(local_docs), str(tmpdir.join('target_a')), 'a', None),
+        (str(broken), str(tmpdir.join('target_b')), 'b', None),
+        (str(local_docs), str(tmpdir.join('target_c')), 'c', str(tmpdir.join('doctrees_c'))),
+    ]
+    assert build_many(builds, versions, jobs) == ['b']
+
+    expected = ['<li><a href="../a/contents.html">a</a></li>', '<li><a href="../b/contents.html">b</a></li>']
+    urls(tmpdir.join('target_c', 'contents.html'), expected + ['<li><a href="contents.html">c</a></li>'])
+    assert not tmpdir.join('target_b', 'contents.html').check()
+    assert tmpdir.join('target_a', '.doctrees', 'environment.pickle').check()
+    assert tmpdir.join('doctrees_c', 'environment.pickle').check()
+    assert not tmpdir.join('target_c', '.doctrees').check()
+
+    # Verify buffered output is in order.
+    output = ''.join(capfd.readouterr())
+    if jobs > 1:
+        assert output.index('build succeeded.') < output.index('NameError') < output.rindex('build succeeded.')
+
+
+@pytest.mark.parametrize('jobs', [0, -1])
+def test_build_many_bad_jobs(jobs):
+    """Verify jobs less than 1 are rejected instead of never starting any build.
+
+    :param int jobs: Number of versions to build concurrently.
+    """
+    with pytest.raises(ValueError):
+        build_many([('source', 'target', 'a', None)], Versions([]), jobs)
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_build_many_exited(monkeypatch, jobs):
+    """Verify builds exiting between polls while nothing is left to start.
+
+    :param monkeypatch: pytest fixture.
+    :param int jobs: Number of versions to build concurrently.
+    """
+    class Process(object):
+        """Fake child process reported as running once, then as exited."""
+
+        def __init__(self, **_):
+            """Constructor."""
+            self.polls = 0
+
+        def start(self):
+            """Do nothing."""
+            pass
+
+        def join(self, _=None):
+            """Do nothing."""
+            pass
+
+        @property
+        def exitcode(self):
+            """Return None (running) the first time, then 0."""
+            self.polls += 1
+            return None if self.polls == 1 else 0
+
+    monkeypatch.setattr('sphinxcontrib.versioning.sphinx_.multiprocessing.Process', Process)
+    versions = Versions([('', n, 'heads', 1, 'conf.py') for n in ('a', 'b')])
+    builds = [('source', 'target_a', 'a', None), ('source', 'target_b', 'b', None)]
+    assert build_many(builds, versions, jobs) == []
+
+
+def test_doctrees(capfd, tmpdir, local_docs):
+    """Verify the pickled environment in a separate doctrees directory is reused by the next build.
+
+    :param capfd: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param local_docs: conftest fixture.
+    """
+    versions = Versions([('', 'master', 'heads', 1, 'conf.py')])
+    doctrees = tmpdir.join('doctrees')
+
+    build(str(local_docs), str(tmpdir.join('first')), versions, 'master', False, str(doctrees))
+    assert doctrees.join('environment.pickle').check()
+    assert not tmpdir.join('first', '.doctrees').check()
+    assert '4 added, 0 changed, 0 removed' in ''.join(capfd.readouterr())
+
+    # Build again into a new target. Nothing is read again.
+    build(str(local_docs), str(tmpdir.join('second')), versions, 'master', False, str(doctrees))
+    assert '0 added, 0 changed, 0 removed' in ''.join(capfd.readouterr())
+    assert tmpdir.join('second', 'contents.html').check()
+
+
+def test_versions_change(capfd, tmpdir, local_docs):
+    """Verify changing versions or the banner rewrites all HTML pages without re-reading documents.
+
+    :param capfd: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param local_docs: conftest fixture.
+    """
+    target = tmpdir.join('target')
+    doctrees = str(tmpdir.join('doctrees'))
+    build(str(local_docs), str(target), Versions([('', 'master', 'heads', 1, 'conf.py')]), 'master', False, doctrees)
+    capfd.readouterr()
+
+    # Nothing changed.
+    build(str(local_docs), str(target), Versions([('', 'master', 'heads', 1, 'conf.py')]), 'master', False, doctrees)
+    assert 'no targets are out of date.' in ''.join(capfd.readouterr())
+
+    # New version.
+    versions = Versions([('', 'master', 'heads', 1, 'conf.py'), ('', 'v1.0.0', 'tags', 2, 'conf.py')])
+    build(str(local_docs), str(target), versions, 'master', False, doctrees)
+    output = ''.join(capfd.readouterr())
+    assert '0 added, 0 changed, 0 removed' in output
+    assert 'no targets are out of date.' not in output
+    assert 'v1.0.0' in target.join('contents.html').read()
+
+
 @pytest.mark.parametrize('pre_existing_versions', [False, True])
 def test_custom_sidebar(tmpdir, local_docs, urls, pre_existing_versions):
     """Make sure user's sidebar item is kept intact.
@@ -210,3 +334,32 @@ def test_subdirs(tmpdir, local_docs, urls):
             '<li><a href="{}master/{}sub.html">master</a></li>'.format('../' * i, 'subdir/' * i),
             '<li><a href="{}feature/{}sub.html">feature</a></li>'.format('../' * i, 'subdir/' * i),
         ])
+
+
+@pytest.mark.parametrize('is_root', [False, True])
+def test_versions_json(tmpdir, config, local_docs, is_root):
+    """Verify the version switcher is loaded from versions.json instead of being in the HTML.
+
+    :param tmpdir: pytest fixture.
+    :param config: conftest fixture.
+    :param local_docs: conftest fixture.
+    :param bool is_root: Build in the web root.
+    """
+    config.versions_json = True
+    target = tmpdir.ensure_dir('target')
+    versions = Versions([('', 'master', 'heads', 1, 'conf.py'), ('', 'feature', 'heads', 2, 'conf.py')])
+    versions['master']['found_docs'] = ('contents', 'subdir/sub')
+    local_docs.join('contents.rst').write('    subdir/sub\n', mode='a')
+    local_docs.ensure('subdir', 'sub.rst').write('Sub\n===\n\nSub directory sub page documentation.\n')
+
+    build(str(local_docs), str(target), versions, 'master', is_root)
+
+    prefix = '' if is_root else '../'
+    contents = target.join('contents.html').read()
+    assert 'data-scv-versions-json="{}versions.json"'.format(prefix) in contents
+    attrs = 'data-scv-pagename="contents" data-scv-current="master"'
+    assert attrs + (' data-scv-is-root>' if is_root else '>') in contents
+    assert 'feature/contents.html' not in contents
+    assert '<script type="text/javascript">' in contents
+    sub = target.join('subdir', 'sub.html').read()
+    assert 'data-scv-versions-json="../{}versions.json"'.format(prefix) in sub
@@ -3,7 +3,8 @@
 import pytest
 
 from sphinxcontrib.versioning.lib import HandledError
-from sphinxcontrib.versioning.sphinx_ import read_config
+from sphinxcontrib.versioning.sphinx_ import build, read_config, read_configs
+from sphinxcontrib.versioning.versions import Versions
 
 
 @pytest.mark.parametrize('mode', ['default', 'overflow', 'conf.py'])
@@ -28,6 +29,30 @@ def test(config, local_docs, mode):
     config = read_config(str(local_docs), 'master')
     assert config['master_doc'] == expected
     assert sorted(config['found_docs']) == [expected, 'one', 'three', 'two']
+    assert isinstance(config['found_docs'], frozenset)
+
+
+@pytest.mark.parametrize('builder', ['html', 'dirhtml'])
+def test_output_names(tmpdir, config, local_docs, builder):
+    """Verify output_names covers everything in the top level of a real build's output directory.
+
+    :param tmpdir: pytest fixture.
+    :param sphinxcontrib.versioning.lib.Config config: conftest fixture.
+    :param local_docs: conftest fixture.
+    :param str builder: Sphinx builder to use.
+    """
+    local_docs.ensure_dir('subdir').join('four.rst').write('Four\n====\n')
+    local_docs.ensure_dir('extra').join('robots.txt').write('')
+    local_docs.join('conf.py').write('html_extra_path = ["extra"]\n')
+    config.overflow += ('-b', builder)
+
+    names = read_config(str(local_docs), 'master')['output_names']
+    target = tmpdir.ensure_dir('target')
+    build(str(local_docs), str(target), Versions([('', 'master', 'heads', 1, 'conf.py')]), 'master', True)
+    actual = set(f.basename for f in target.listdir())
+    assert 'robots.txt' in actual
+    assert 'subdir' in actual
+    assert actual <= names
 
 
 def test_sphinx_error(local_docs):
@@ -38,3 +63,41 @@ def test_sphinx_error(local_docs):
     local_docs.join('conf.py').write('undefined')
     with pytest.raises(HandledError):
         read_config(str(local_docs), 'master')
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_read_configs(capfd, tmpdir, local_docs, jobs):
+    """Verify reading many configs with one broken, without parsing any documents.
+
+    :param capfd: pytest fixture.
+    :param tmpdir: pytest fixture.
+    :param local_docs: conftest fixture.
+    :param int jobs: Number of configs to read concurrently.
+    """
+    broken = tmpdir.ensure_dir('broken')
+    broken.join('conf.py').write('undefined')
+    other = tmpdir.ensure_dir('other')
+    other.join('conf.py').write('master_doc = "index"\n')
+    other.join('index.rst').write('Test\n====\n')
+
+    sources = [(str(local_docs), 'a'), (str(broken), 'b'), (str(other), 'c')]
+    configs = read_configs(sources, jobs)
+    assert configs[0]['master_doc'] == 'contents'
+    assert sorted(configs[0]['found_docs']) == ['contents', 'one', 'three', 'two']
+    assert configs[1] is None
+    assert configs[2]['master_doc'] == 'index'
+    assert configs[2]['found_docs'] == frozenset(['index'])
+
+    output = ''.join(capfd.readouterr())
+    assert 'reading sources' not in output
+    assert 'NameError' in output
+
+
+@pytest.mark.parametrize('jobs', [0, -1])
+def test_read_configs_bad_jobs(jobs):
+    """Verify jobs less than 1 are rejected instead of never starting any read.
+
+    :param int jobs: Number of configs to read concurrently.
+    """
+    with pytest.raises(ValueError):
+        read_configs([('source', 'a')], jobs)
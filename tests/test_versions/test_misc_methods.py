@@ -84,6 +84,36 @@ def test_getitem():
         assert versions['unknown']
 
 
+def test_getitem_after_changes():
+    """Test Versions.__getitem__ stays consistent when remotes are removed, added, or replaced."""
+    versions = Versions(REMOTES)
+    assert versions['master']['sha'] == REMOTES[1][0]
+    assert versions['23781']['name'] == 'v3.0.0'
+    assert versions['ded175']['name'] == 'v10.0.0'  # Not a prefix.
+
+    # Pop.
+    versions.remotes.pop(versions.remotes.index(versions['master']))
+    with pytest.raises(KeyError):
+        assert versions['master']
+    with pytest.raises(KeyError):
+        assert versions['abaaa']
+    assert versions[1]['name'] == 'v1.2.0'
+
+    # Append and remove.
+    versions.remotes.append(dict(id='heads/new', sha='abaaa' + '0' * 35, name='new', kind='heads', date=1))
+    assert versions['abaaa']['name'] == 'new'
+    assert versions[1]['name'] == 'new'
+    versions.remotes.remove(versions['v3.0.0'])
+    with pytest.raises(KeyError):
+        assert versions['23781']
+
+    # Replace whole list.
+    versions.remotes = [r for r in versions.remotes if r['kind'] == 'heads']
+    assert [r['name'] for r in versions.remotes] == ['zh-pages', 'new']
+    with pytest.raises(KeyError):
+        assert versions['v1.2.0']
+
+
 def test_bool_len():
     """Test length and boolean values of Versions and .branches/.tags."""
     versions = Versions(REMOTES)
@@ -196,3 +196,25 @@ def test_c():
     assert versions.vpathto('c') == 'D.html'
     pairs = list(versions)
     assert pairs == [('a', '../../../../a/contents.html'), ('b', '../../../../b/contents.html'), ('c', 'D.html')]
+
+
+def test_page_links():
+    """Test links are computed once per page and recomputed for other pages or when versions change."""
+    versions = get_versions(dict(current_version='a', scv_is_root=False, pagename='sub/2'))
+    expected = [
+        ('a', '2.html', 'heads'),
+        ('b', '../../b/sub/2.html', 'heads'),
+        ('c', '../../c_/contents.html', 'heads'),
+    ]
+    assert versions.page_links == expected
+    assert versions.page_links is versions.page_links
+    assert versions.branches == [(n, u) for n, u, _ in expected]
+    assert versions.tags == []
+
+    # Other page.
+    versions.context = dict(current_version='a', scv_is_root=True, pagename='1')
+    assert list(versions) == [('a', 'a/1.html'), ('b', 'b/1.html'), ('c', 'c_/contents.html')]
+
+    # Versions changed.
+    versions.remotes.pop(1)
+    assert list(versions) == [('a', 'a/1.html'), ('c', 'c_/contents.html')]